@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import ctypes
+import hashlib
+
+from io import BytesIO
+from multiprocessing import Array, Lock, resource_tracker, shared_memory
+
+
+def _create(name, size):
+
+    # Lifetime of blobs is managed by reference counting across processes,
+    # so the creating process must not unlink them when it exits
+    try:
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+    except FileExistsError:
+        # Left behind by a previous run that did not shut down cleanly
+        _unlink(name)
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+    resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
+
+
+def _attach(name):
+
+    # Segments are owned (and unlinked) by the process that created them.
+    # Attaching processes must not register them with their own resource
+    # tracker, otherwise it would unlink the segment when they exit.
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+def _unlink(name):
+
+    # Unlinking unregisters the segment from the resource tracker, hence it
+    # must be registered (i.e., attached with tracking) beforehand
+    try:
+        shm = shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+    shm.close()
+    shm.unlink()
+
+
+class Frame:
+    """
+    Handle of a raw RGB frame stored in a FrameRing.
+
+    Only this handle travels between processes, the pixel data stays in the
+    shared memory segment.
+    """
+
+    def __init__(self, name, slot, size, number):
+
+        self._name = name
+        self._slot = slot
+        self._size = size
+        self._number = number
+
+    def __str__(self):
+
+        return 'Frame({}, {})'.format(self._number, self._slot)
+
+    @property
+    def name(self):
+        """Return the name of the shared memory segment"""
+        return self._name
+
+    @property
+    def slot(self):
+        """Return the slot of the frame within the ring"""
+        return self._slot
+
+    @property
+    def size(self):
+        """Return the frame dimensions as (width, height)"""
+        return self._size
+
+    @property
+    def number(self):
+        """Return the sequence number of the frame"""
+        return self._number
+
+
+class FrameRing:
+    """
+    Ring buffer of raw RGB frames in shared memory.
+
+    The camera process creates the ring and writes frames into consecutive
+    slots, the GUI attaches to it by name and reads the slots in place.
+    With three slots, the frame on screen, the frame on its way to the GUI
+    and the frame being written never share a slot, as long as the camera
+    writes a frame only after the previous one has been received and the
+    GUI receives a frame only after painting the previous one.
+    """
+
+    def __init__(self, size, slots=3, shm=None):
+
+        self._size = tuple(size)
+        self._slots = slots
+        self._frame_bytes = self._size[0] * self._size[1] * 3
+        self._counter = 0
+
+        if shm is None:
+            self._is_owner = True
+            self._shm = shared_memory.SharedMemory(
+                create=True, size=self._frame_bytes * self._slots)
+        else:
+            self._is_owner = False
+            self._shm = shm
+
+    @classmethod
+    def attach(cls, frame):
+        """Attach to the ring that holds the given frame"""
+        shm = _attach(frame.name)
+        slots = shm.size // (frame.size[0] * frame.size[1] * 3)
+        return cls(frame.size, slots, shm)
+
+    @property
+    def name(self):
+
+        return self._shm.name
+
+    @property
+    def size(self):
+
+        return self._size
+
+    def close(self):
+
+        self._shm.close()
+        if self._is_owner:
+            self._shm.unlink()
+
+    def write(self, picture):
+        """Copy a PIL image into the next slot and return its Frame handle"""
+        if picture.size != self._size:
+            raise ValueError('picture must be of size {}'.format(self._size))
+        if picture.mode != 'RGB':
+            picture = picture.convert('RGB')
+
+        slot = self._counter % self._slots
+        offset = slot * self._frame_bytes
+        self._shm.buf[offset:offset + self._frame_bytes] = picture.tobytes()
+        self._counter += 1
+
+        return Frame(self.name, slot, self._size, self._counter)
+
+    def view(self, frame):
+        """Return a memoryview on the pixel data of the given frame"""
+        offset = frame.slot * self._frame_bytes
+        return self._shm.buf[offset:offset + self._frame_bytes]
+
+
+class Blob:
+    """
+    Handle of an immutable byte payload stored in a BlobStore.
+
+    The payload is copied out of shared memory only when it is read for the
+    first time in a process.
+    """
+
+    def __init__(self, slot, name, size):
+
+        self._slot = slot
+        self._name = name
+        self._size = size
+        self._data = None
+
+    def __str__(self):
+
+        return 'Blob({}, {} bytes)'.format(self._name, self._size)
+
+    def __getstate__(self):
+
+        state = self.__dict__.copy()
+        state['_data'] = None
+        return state
+
+    @property
+    def slot(self):
+        """Return the slot of the blob within the store"""
+        return self._slot
+
+    @property
+    def name(self):
+        """Return the name of the shared memory segment"""
+        return self._name
+
+    @property
+    def size(self):
+        """Return the size of the payload in bytes"""
+        return self._size
+
+    def read(self):
+        """Return the payload as BytesIO"""
+        if self._data is None:
+            shm = _attach(self._name)
+            try:
+                self._data = bytes(shm.buf[:self._size])
+            finally:
+                shm.close()
+
+        return BytesIO(self._data)
+
+
+class BlobStore:
+    """
+    Content-addressed, reference counted store of byte payloads.
+
+    Storing a payload yields a Blob holding one reference. Identical
+    payloads share a single shared memory segment, which is unlinked once
+    the last reference is released.
+    """
+
+    def __init__(self, capacity=16):
+
+        self._lock = Lock()
+        self._refs = Array(ctypes.c_int, capacity, lock=False)
+        self._digests = Array(ctypes.c_char, capacity * 20, lock=False)
+
+    def _name(self, digest):
+
+        return 'photobooth-' + digest.hex()[:16]
+
+    def _digest(self, slot):
+
+        return self._digests.raw[slot * 20:(slot + 1) * 20]
+
+    def put(self, data):
+
+        data = memoryview(data)
+        digest = hashlib.sha1(data).digest()
+        name = self._name(digest)
+
+        with self._lock:
+            free = None
+            for slot in range(len(self._refs)):
+                if self._refs[slot] == 0:
+                    if free is None:
+                        free = slot
+                elif self._digest(slot) == digest:
+                    self._refs[slot] += 1
+                    return Blob(slot, name, len(data))
+
+            if free is None:
+                raise RuntimeError('No free slot in blob store')
+
+            shm = _create(name, max(len(data), 1))
+            shm.buf[:len(data)] = data
+            shm.close()
+
+            self._refs[free] = 1
+            self._digests[free * 20:(free + 1) * 20] = digest
+
+        return Blob(free, name, len(data))
+
+    def retain(self, blob, count=1):
+
+        with self._lock:
+            if self._refs[blob.slot] <= 0:
+                raise RuntimeError('{} has already been released'.format(blob))
+            self._refs[blob.slot] += count
+
+    def release(self, blob):
+
+        with self._lock:
+            if self._refs[blob.slot] <= 0:
+                raise RuntimeError('{} has already been released'.format(blob))
+            self._refs[blob.slot] -= 1
+            if self._refs[blob.slot] == 0:
+                _unlink(blob.name)
+
+    def clear(self):
+
+        with self._lock:
+            for slot in range(len(self._refs)):
+                if self._refs[slot] > 0:
+                    self._refs[slot] = 0
+                    _unlink(self._name(self._digest(slot)))
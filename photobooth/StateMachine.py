@@ -3,6 +3,7 @@
 
 import logging
 
+from .SharedMemory import Blob
 from .Threading import Workers
 
 class Context:
@@ -43,6 +44,11 @@ class Context:
 
         logging.debug('Context: New state is "{}"'.format(new_state))
 
+        # Keep blobs of the current state alive, e.g., for an error retry
+        self._comm.retain(new_state)
+        if hasattr(self, '_state'):
+            self._comm.release(self._state)
+
         self._state = new_state
         self._comm.bcast(self._state)
 
@@ -172,6 +178,11 @@ class CameraEvent(Event):
 
         return self._picture
 
+    @property
+    def blobs(self):
+
+        return (self._picture, ) if isinstance(self._picture, Blob) else ()
+
 
 class WorkerEvent(Event):
 
@@ -247,6 +258,11 @@ class ErrorState(State):
 
         self._old_state = old_state
 
+    @property
+    def blobs(self):
+
+        return getattr(self._old_state, 'blobs', ())
+
     @property
     def is_running(self):
 
@@ -433,7 +449,15 @@ class ReviewState(State):
     @property
     def picture(self):
 
-        return self._picture
+        if isinstance(self._picture, Blob):
+            return self._picture.read()
+        else:
+            return self._picture
+
+    @property
+    def blobs(self):
+
+        return (self._picture, ) if isinstance(self._picture, Blob) else ()
 
     def handleEvent(self, event, context):
 
@@ -1,8 +1,20 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import ctypes
+import pickle
+import queue
+
 from enum import IntEnum
-from multiprocessing import Queue
+from functools import partial
+from multiprocessing import Array, Condition, Queue, Semaphore, Value
+
+from .SharedMemory import BlobStore
+
+
+def _blobs(message):
+
+    return getattr(message, 'blobs', ())
 
 
 class Communicator:
@@ -11,40 +23,229 @@ class Communicator:
 
         super().__init__()
 
-        self._queues = [Queue() for _ in Workers]
+        # Every worker has one queue per lane, the semaphore counts the
+        # messages pending across all lanes
+        self._queues = [[Queue() for _ in Lanes] for _ in Workers]
+        self._pending = [Semaphore(0) for _ in Workers]
+        self._preview = Mailbox()
+        self._blobs = BlobStore()
+
+        # Message types delivered by bcast (None for all) and the number of
+        # messages that were not sent because nobody subscribed to them
+        self._topics = [None for _ in Workers]
+        self._skipped = Array(ctypes.c_ulonglong, len(Workers), lock=False)
+
+    @property
+    def preview(self):
 
-    def bcast(self, message):
+        return self._preview
 
-        for q in self._queues[1:]:
-            q.put(message)
+    @property
+    def blobs(self):
 
-    def send(self, target, message):
+        return self._blobs
+
+    def retain(self, message):
+
+        for blob in _blobs(message):
+            self._blobs.retain(blob)
+
+    def release(self, message):
+
+        for blob in _blobs(message):
+            self._blobs.release(blob)
+
+    def subscribe(self, worker, topics):
+        """
+        Restrict broadcasts to a worker to the given message types.
+
+        Must be called before the worker processes are started. The
+        end-of-stream marker is always delivered.
+        """
+        if not isinstance(worker, Workers):
+            raise TypeError('worker must be a member of Workers')
+
+        self._topics[worker] = None if topics is None else tuple(topics)
+
+    def skipped(self, worker):
+        """Return the number of broadcasts not delivered to a worker"""
+        if not isinstance(worker, Workers):
+            raise TypeError('worker must be a member of Workers')
+
+        return self._skipped[worker]
+
+    def bcast(self, message, lane=None):
+
+        for worker in list(Workers)[1:]:
+            topics = self._topics[worker]
+            if (message is not None and topics is not None and
+                    not isinstance(message, topics)):
+                self._skipped[worker] += 1
+                continue
+
+            # Blobs are shared by reference, every recipient gets its own
+            # reference which is released once it has handled the message
+            self.retain(message)
+            self.send(worker, message, lane)
+
+    def send(self, target, message, lane=None):
 
         if not isinstance(target, Workers):
             raise TypeError('target must be a member of Workers')
 
-        self._queues[target].put(message)
+        if message is None:
+            # The end-of-stream marker goes last so that no pending message
+            # of any lane is left behind
+            lane = list(Lanes)[-1]
+        elif lane is None:
+            lane = Lanes.CONTROL
+        elif not isinstance(lane, Lanes):
+            raise TypeError('lane must be a member of Lanes')
+
+        self._queues[target][lane].put(message)
+        self._pending[target].release()
 
     def recv(self, worker, block=True):
 
         if not isinstance(worker, Workers):
             raise TypeError('worker must be a member of Workers')
 
-        return self._queues[worker].get(block)
+        if not self._pending[worker].acquire(block):
+            raise queue.Empty
 
-    def iter(self, worker):
+        # Drain lanes in order of priority. A message announced by the
+        # semaphore might still be in transit, hence the short timeout on
+        # the last lane before checking the higher priority lanes again.
+        lanes = self._queues[worker]
+        while True:
+            for q in lanes[:-1]:
+                try:
+                    return q.get(False)
+                except queue.Empty:
+                    pass
+            try:
+                return lanes[-1].get(True, 0.01)
+            except queue.Empty:
+                pass
 
+    def iter(self, worker, prefetch=False):
+        """
+        Iterate over received messages until the end-of-stream marker.
+
+        References to blobs of a message are released when the loop body
+        has handled it. Receivers that hand messages over to another thread
+        must prefetch them so that blobs are still readable afterwards.
+        """
         if not isinstance(worker, Workers):
             raise TypeError('worker must be a member of Workers')
 
-        return iter(self._queues[worker].get, None)
+        for message in iter(partial(self.recv, worker), None):
+            try:
+                if prefetch:
+                    for blob in _blobs(message):
+                        blob.read()
+                yield message
+            finally:
+                self.release(message)
 
     def empty(self, worker):
 
         if not isinstance(worker, Workers):
             raise TypeError('worker must be a member of Workers')
 
-        return self._queues[worker].empty()
+        return all(q.empty() for q in self._queues[worker])
+
+    def depth(self, worker, lane):
+        """Return the approximate number of messages pending in a lane"""
+        if not isinstance(worker, Workers):
+            raise TypeError('worker must be a member of Workers')
+        if not isinstance(lane, Lanes):
+            raise TypeError('lane must be a member of Lanes')
+
+        return self._queues[worker][lane].qsize()
+
+
+class Mailbox:
+    """
+    Single-slot channel between processes where the latest message wins.
+
+    Posting a message while the previous one is still pending replaces it,
+    so a slow receiver never works through a backlog of stale messages.
+    """
+
+    def __init__(self, capacity=4096):
+
+        super().__init__()
+
+        self._cond = Condition()
+        self._data = Array(ctypes.c_char, capacity, lock=False)
+        self._length = Value(ctypes.c_int, 0, lock=False)
+        self._pending = Value(ctypes.c_bool, False, lock=False)
+        self._closed = Value(ctypes.c_bool, False, lock=False)
+        self._posted = Value(ctypes.c_ulonglong, 0, lock=False)
+        self._dropped = Value(ctypes.c_ulonglong, 0, lock=False)
+
+    @property
+    def posted(self):
+        """Return the number of messages posted so far"""
+        return self._posted.value
+
+    @property
+    def dropped(self):
+        """Return the number of messages replaced before being received"""
+        return self._dropped.value
+
+    def close(self):
+
+        with self._cond:
+            self._closed.value = True
+            self._cond.notify_all()
+
+    def put(self, message):
+
+        data = pickle.dumps(message)
+        if len(data) > len(self._data):
+            raise ValueError('message exceeds mailbox capacity')
+
+        with self._cond:
+            if self._closed.value:
+                return
+            if self._pending.value:
+                self._dropped.value += 1
+            self._data[:len(data)] = data
+            self._length.value = len(data)
+            self._pending.value = True
+            self._posted.value += 1
+            self._cond.notify_all()
+
+    def get(self, block=True, timeout=None):
+        """Return the pending message, or None if closed or timed out"""
+        with self._cond:
+            if block:
+                self._cond.wait_for(
+                    lambda: self._pending.value or self._closed.value,
+                    timeout)
+            if self._closed.value or not self._pending.value:
+                return None
+            data = self._data[:self._length.value]
+            self._pending.value = False
+            self._cond.notify_all()
+
+        return pickle.loads(data)
+
+    def wait(self, timeout=None):
+        """Block until the pending message has been received"""
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: not self._pending.value or self._closed.value,
+                timeout)
+
+
+class Lanes(IntEnum):
+
+    # Lanes are drained in this order, messages within a lane stay in order
+    CONTROL = 0
+    BULK = 1
 
 
 class Workers(IntEnum):
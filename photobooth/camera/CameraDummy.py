@@ -27,6 +27,10 @@ class CameraDummy(CameraInterface):
 
         return self.getPicture()
 
+    def getPictureSize(self):
+
+        return self._size
+
     def getPicture(self):
 
         self._hue = (self._hue + 1) % 360
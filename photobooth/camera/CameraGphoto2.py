@@ -123,12 +123,26 @@ class CameraGphoto2(CameraInterface):
 
     def getPicture(self):
 
+        return Image.open(self.getPictureData())
+
+    def getPictureSize(self):
+
+        try:
+            config = self._cap.get_config()
+            value = config.get_child_by_name('imagesize').get_value()
+        except gp.GPhoto2Error:
+            return None
+
+        return self._parseSize(value)
+
+    def getPictureData(self):
+
         file_path = self._cap.capture(gp.GP_CAPTURE_IMAGE)
         camera_file = self._cap.file_get(file_path.folder, file_path.name,
                                          gp.GP_FILE_TYPE_NORMAL)
         file_data = camera_file.get_data_and_size()
         self._cap.file_delete(file_path.folder, file_path.name)
-        return Image.open(io.BytesIO(file_data))
+        return io.BytesIO(file_data)
 
     def keepAlive(self):
 
@@ -110,4 +110,17 @@ class CameraGphoto2Cffi(CameraInterface):
 
     def getPicture(self):
 
-        return Image.open(io.BytesIO(self._cap.capture()))
+        return Image.open(self.getPictureData())
+
+    def getPictureSize(self):
+
+        try:
+            value = self._cap.config['imgsettings']['imagesize'].value
+        except Exception:
+            return None
+
+        return self._parseSize(value)
+
+    def getPictureData(self):
+
+        return io.BytesIO(self._cap.capture())
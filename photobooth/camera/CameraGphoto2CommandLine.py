@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import io
 import logging
 import os
 import subprocess
@@ -36,8 +37,13 @@ class CameraGphoto2CommandLine(CameraInterface):
 
     def getPicture(self):
 
+        return Image.open(self.getPictureData())
+
+    def getPictureData(self):
+
         self._callGphoto('--capture-image-and-download', self._tmp_filename)
-        return Image.open(self._tmp_filename)
+        with open(self._tmp_filename, 'rb') as f:
+            return io.BytesIO(f.read())
 
     def _callGphoto(self, action, filename):
 
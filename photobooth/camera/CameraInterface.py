@@ -4,6 +4,9 @@
 import configparser
 import logging
 import os
+import re
+
+from io import BytesIO
 
 
 class CameraInterface:
@@ -12,6 +15,7 @@ class CameraInterface:
 
         self.hasPreview = False
         self.hasIdle = False
+        self._model = type(self).__name__
         self._initConfig()
 
     def __enter__(self):
@@ -56,6 +60,11 @@ class CameraInterface:
     def config(self):
         return self._cfg
 
+    @property
+    def model(self):
+
+        return self._model
+
     def setActive(self):
 
         if not self.hasIdle:
@@ -81,6 +90,28 @@ class CameraInterface:
 
         raise NotImplementedError()
 
+    def getPictureSize(self):
+
+        # Cameras should override this to report the size of captured
+        # pictures as (width, height) without taking a picture, if possible
+        return None
+
+    @staticmethod
+    def _parseSize(value):
+
+        match = re.match(r'\s*(\d+)\s*x\s*(\d+)', str(value))
+        if match is None:
+            return None
+        return (int(match.group(1)), int(match.group(2)))
+
+    def getPictureData(self):
+
+        # Cameras that deliver JPEG data should override this to hand out
+        # the encoded picture unchanged instead of re-encoding it here
+        byte_data = BytesIO()
+        self.getPicture().save(byte_data, format='jpeg')
+        return byte_data
+
     def _initConfig(self):
 
         self._cfg = configparser.ConfigParser(interpolation=None)
@@ -90,6 +121,7 @@ class CameraInterface:
 
     def loadConfig(self, model):
 
+        self._model = model
         name = ''.join(c for c in model.lower() if c.isalnum()) + '.cfg'
         filename = os.path.join(os.path.dirname(__file__), 'models', name)
         logging.info('Loading camera config "{}"'.format(name))
@@ -39,6 +39,13 @@ class CameraOpenCV(CameraInterface):
 
         return self.getPicture()
 
+    def getPictureSize(self):
+
+        self.setActive()
+        size = (int(self._cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                int(self._cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        return size if all(size) else None
+
     def getPicture(self):
 
         self.setActive()
@@ -25,8 +25,9 @@ class CameraPicamera(CameraInterface):
         self._cap = None
 
         self.setActive()
-        self._preview_resolution = (self._cap.resolution[0] // 2,
-                                    self._cap.resolution[1] // 2)
+        self._resolution = tuple(self._cap.resolution)
+        self._preview_resolution = (self._resolution[0] // 2,
+                                    self._resolution[1] // 2)
         self.setIdle()
 
     def setActive(self):
@@ -51,8 +52,16 @@ class CameraPicamera(CameraInterface):
 
     def getPicture(self):
 
+        return Image.open(self.getPictureData())
+
+    def getPictureSize(self):
+
+        return self._resolution
+
+    def getPictureData(self):
+
         self.setActive()
         stream = io.BytesIO()
         self._cap.capture(stream, format='jpeg', resize=None)
         stream.seek(0)
-        return Image.open(stream)
+        return stream
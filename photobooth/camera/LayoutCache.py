@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import glob
+import hashlib
+import json
+import logging
+import os
+
+from PIL import Image
+
+from ..util import cache_path
+
+
+class LayoutCache:
+    """
+    On-disk cache of the picture layout and the background template.
+
+    Entries are keyed by the config options that define the layout, the
+    capture size and the modification time of the background, so any change
+    to them results in a cache miss. The template is stored as raw pixel
+    data that can be loaded without decoding or resampling.
+    """
+
+    # Options that affect the layout of the assembled picture
+    options = (('Picture', 'num_x'), ('Picture', 'num_y'),
+               ('Picture', 'size_x'), ('Picture', 'size_y'),
+               ('Picture', 'inner_dist_x'), ('Picture', 'inner_dist_y'),
+               ('Picture', 'outer_dist_x'), ('Picture', 'outer_dist_y'),
+               ('Picture', 'skip'), ('Picture', 'background'),
+               ('Gui', 'width'), ('Gui', 'height'))
+
+    def __init__(self, config, capture_size):
+
+        key = [config.get(section, option)
+               for section, option in self.options]
+        key.append(list(capture_size))
+
+        background = config.get('Picture', 'background')
+        if len(background) > 0:
+            try:
+                key.append(os.stat(background).st_mtime_ns)
+            except OSError:
+                key.append(None)
+
+        digest = hashlib.sha1(json.dumps(key).encode('utf-8')).hexdigest()
+        self._path = cache_path('layout-' + digest[:16])
+
+    def load(self):
+        """Return the cached (layout, template) or None on a cache miss"""
+        try:
+            with open(self._path + '.json', 'r') as f:
+                layout = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        template = None
+        if 'template' in layout:
+            mode, size = layout['template']
+            try:
+                with open(self._path + '.raw', 'rb') as f:
+                    template = Image.frombytes(mode, tuple(size), f.read())
+            except (OSError, ValueError):
+                return None
+
+        return layout, template
+
+    def store(self, layout, template=None):
+
+        layout = dict(layout)
+        try:
+            # Only one layout is cached at a time
+            for filename in glob.glob(cache_path('layout-*')):
+                os.remove(filename)
+
+            if template is not None:
+                # Raw data of palette images would lose their palette
+                if template.mode not in ('1', 'L', 'RGB', 'RGBA'):
+                    template = template.convert('RGB')
+                layout['template'] = (template.mode, template.size)
+                with open(self._path + '.raw', 'wb') as f:
+                    f.write(template.tobytes())
+            with open(self._path + '.json.tmp', 'w') as f:
+                json.dump(layout, f)
+            os.replace(self._path + '.json.tmp', self._path + '.json')
+        except OSError as e:
+            logging.warn('Could not store layout cache: {}'.format(e))
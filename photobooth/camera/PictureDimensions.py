@@ -6,7 +6,7 @@ import logging
 
 class PictureDimensions:
 
-    def __init__(self, config, capture_size):
+    def __init__(self, config, capture_size, layout=None):
 
         self._num_pictures = (config.getInt('Picture', 'num_x'),
                               config.getInt('Picture', 'num_y'))
@@ -25,9 +25,17 @@ class PictureDimensions:
                       if 1 <= i and
                       i <= self._num_pictures[0] * self._num_pictures[1]]
 
-        self.computeThumbnailDimensions()
-
-        self.computePreviewDimensions(config)
+        if capture_size is None:
+            # Only the number of pictures is known without a capture size
+            pass
+        elif layout is None:
+            self.computeThumbnailDimensions()
+            self.computePreviewDimensions(config)
+        else:
+            self._thumb_size = tuple(layout['thumbnail_size'])
+            self._thumb_offsets = [tuple(offset)
+                                   for offset in layout['thumbnail_offsets']]
+            self._preview_size = tuple(layout['preview_size'])
 
     def _computeResizeFactor(self, coord, inner_size):
 
@@ -82,6 +90,13 @@ class PictureDimensions:
         self._preview_size = tuple(int(self.captureSize[i] * resize_factor)
                                    for i in range(2))
 
+    @property
+    def layout(self):
+
+        return {'thumbnail_size': self.thumbnailSize,
+                'thumbnail_offsets': self.thumbnailOffset,
+                'preview_size': self.previewSize}
+
     @property
     def numPictures(self):
 
@@ -1,14 +1,21 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import json
 import logging
+import os
+import time
 
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image, ImageOps
 from io import BytesIO
 
+from .LayoutCache import LayoutCache
 from .PictureDimensions import PictureDimensions
 from .. import StateMachine
-from ..Threading import Workers
+from ..SharedMemory import FrameRing
+from ..Threading import Lanes, Workers
+from ..util import cache_path, rotate_jpeg
 from .CameraGphoto2 import CameraGphoto2
 
 # Available camera modules as tuples of (config name, module name, class name)
@@ -24,6 +31,12 @@ modules = (
 
 class Camera:
 
+    # States handled by this worker, ErrorState stops the preview loop
+    topics = (StateMachine.StartupState, StateMachine.IdleState,
+              StateMachine.GreeterState, StateMachine.CountdownState,
+              StateMachine.CaptureState, StateMachine.AssembleState,
+              StateMachine.ErrorState, StateMachine.TeardownState)
+
     def __init__(self, config, comm, CameraModule):
 
         super().__init__()
@@ -33,14 +46,33 @@ class Camera:
         self._cam = CameraModule
 
         self._cap = None
+        self._capture_size = None
         self._pic_dims = None
+        self._preview = None
+
+        # Shots are composited in the background while the next one is taken
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._picture = None
+        self._thumbnails = {}
 
         self._is_preview = self._cfg.getBool('Photobooth', 'show_preview')
         self._is_keep_pictures = self._cfg.getBool('Picture', 'keep_pictures')
 
         rot_vals = {0: None, 90: Image.ROTATE_90, 180: Image.ROTATE_180,
                     270: Image.ROTATE_270}
-        self._rotation = rot_vals[self._cfg.getInt('Camera', 'rotation')]
+        self._angle = self._cfg.getInt('Camera', 'rotation')
+        self._rotation = rot_vals[self._angle]
+
+        # Encoder options for the assembled picture
+        subsampling = self._cfg.get('Picture', 'jpeg_subsampling')
+        if subsampling not in ('4:4:4', '4:2:2', '4:2:0'):
+            raise ValueError('Unknown chroma subsampling "{}"'.format(
+                subsampling))
+        self._jpeg_options = {
+            'quality': self._cfg.getInt('Picture', 'jpeg_quality'),
+            'optimize': self._cfg.getBool('Picture', 'jpeg_optimize'),
+            'progressive': self._cfg.getBool('Picture', 'jpeg_progressive'),
+            'subsampling': subsampling}
 
     def startup(self):
 
@@ -49,15 +81,33 @@ class Camera:
         logging.info('Using camera {} preview functionality'.format(
             'with' if self._is_preview else 'without'))
 
-        test_picture = self._cap.getPicture()
-        if self._rotation is not None:
-            test_picture = test_picture.transpose(self._rotation)
+        self._capture_size = self.negotiateCaptureSize()
+        size = self._capture_size
+        if self._angle in (90, 270):
+            size = size[::-1]
+
+        cache = LayoutCache(self._cfg, size)
+        cached = cache.load()
+        if cached is not None:
+            logging.info('Using cached picture layout')
+            layout, template = cached
+            self._pic_dims = PictureDimensions(self._cfg, size, layout)
+        else:
+            template = None
+            self._pic_dims = PictureDimensions(self._cfg, size)
 
-        self._pic_dims = PictureDimensions(self._cfg, test_picture.size)
         self._is_preview = self._is_preview and self._cap.hasPreview
 
+        if self._preview is not None:
+            self._preview.close()
+            self._preview = None
+        if self._is_preview:
+            self._preview = FrameRing(self._pic_dims.previewSize)
+
         background = self._cfg.get('Picture', 'background')
-        if len(background) > 0:
+        if template is not None:
+            self._template = template
+        elif len(background) > 0:
             logging.info('Using background "{}"'.format(background))
             bg_picture = Image.open(background)
             self._template = bg_picture.resize(self._pic_dims.outputSize)
@@ -65,6 +115,11 @@ class Camera:
             self._template = Image.new('RGB', self._pic_dims.outputSize,
                                        (255, 255, 255))
 
+        # A plain white template is cheaper to create than to load
+        if cached is None:
+            cache.store(self._pic_dims.layout,
+                        self._template if len(background) > 0 else None)
+
         self.setIdle()
         self._comm.send(Workers.MASTER, StateMachine.CameraEvent('ready'))
 
@@ -73,6 +128,10 @@ class Camera:
         if self._cap is not None:
             self._cap.cleanup()
 
+        if self._preview is not None:
+            self._preview.close()
+            self._preview = None
+
     def run(self):
 
         for state in self._comm.iter(Workers.CAMERA):
@@ -118,36 +177,63 @@ class Camera:
     def prepareCapture(self):
 
         self.setActive()
-        self._pictures = []
+        self._thumbnails = {}
+        self._executor.submit(self._newPicture)
 
     def capturePreview(self):
 
         if self._is_preview:
+            mailbox = self._comm.preview
+            posted, dropped = mailbox.posted, mailbox.dropped
             while self._comm.empty(Workers.CAMERA):
                 picture = self._cap.getPreview()
                 if self._rotation is not None:
                     picture = picture.transpose(self._rotation)
                 picture = picture.resize(self._pic_dims.previewSize)
                 picture = ImageOps.mirror(picture)
-                byte_data = BytesIO()
-                picture.save(byte_data, format='jpeg')
-                self._comm.send(Workers.GUI,
-                                StateMachine.CameraEvent('preview', byte_data))
+                frame = self._preview.write(picture)
+                mailbox.put(StateMachine.CameraEvent('preview', frame))
+                # Do not capture faster than the GUI is able to show frames.
+                # It fetches a frame only after painting the previous one,
+                # so the slots of both are never overwritten meanwhile.
+                while (not mailbox.wait(0.1) and
+                       self._comm.empty(Workers.CAMERA)):
+                    pass
+
+            logging.debug('Preview: %d frames shown, %d dropped',
+                          mailbox.posted - posted, mailbox.dropped - dropped)
 
     def capturePicture(self, state):
 
         self.setIdle()
-        picture = self._cap.getPicture()
-        if self._rotation is not None:
-            picture = picture.transpose(self._rotation)
-        byte_data = BytesIO()
-        picture.save(byte_data, format='jpeg')
-        self._pictures.append(byte_data)
+        byte_data = self._cap.getPictureData()
         self.setActive()
 
+        # Compare the size before rotating, the header is parsed only
+        picture = Image.open(byte_data)
+        self.checkCaptureSize(picture.size)
+
+        # Keep the encoded picture as delivered by the camera and rotate it
+        # via its EXIF orientation, only re-encode if that is not possible.
+        # As before, the orientation is solely defined by the configured
+        # rotation, the camera's own orientation tag is replaced.
+        rotated = rotate_jpeg(byte_data.getvalue(), self._angle)
+        if rotated is not None:
+            byte_data = BytesIO(rotated)
+        else:
+            if self._rotation is not None:
+                picture = picture.transpose(self._rotation)
+            byte_data = BytesIO()
+            picture.save(byte_data, format='jpeg')
+
+        index = state.num_picture - 1
+        self._thumbnails[index] = self._executor.submit(
+            self._addThumbnail, index, BytesIO(byte_data.getvalue()))
+
         if self._is_keep_pictures:
             self._comm.send(Workers.WORKER,
-                            StateMachine.CameraEvent('capture', byte_data))
+                            StateMachine.CameraEvent('capture', byte_data),
+                            Lanes.BULK)
 
         if state.num_picture < self._pic_dims.totalNumPictures:
             self._comm.send(Workers.MASTER,
@@ -156,18 +242,115 @@ class Camera:
             self._comm.send(Workers.MASTER,
                             StateMachine.CameraEvent('assemble'))
 
+    def negotiateCaptureSize(self):
+
+        # Size of pictures as delivered by the camera, i.e., before rotation.
+        # Taking a test picture is only the last resort as it is slow.
+        size = self._cap.getPictureSize()
+        if size is not None:
+            logging.info('Camera reports picture size %dx%d', *size)
+            return tuple(size)
+
+        size = self._loadCaptureSize()
+        if size is not None:
+            logging.info('Using cached picture size %dx%d for "%s"', *size,
+                         self._cap.model)
+            return size
+
+        logging.info('Taking test picture to determine picture size')
+        size = Image.open(self._cap.getPictureData()).size
+        self._storeCaptureSize(size)
+        return size
+
+    def _loadCaptureSize(self):
+
+        try:
+            with open(cache_path('capture_size.json'), 'r') as f:
+                size = json.load(f).get(self._cap.model)
+        except (OSError, ValueError):
+            return None
+
+        return tuple(size) if size is not None else None
+
+    def _storeCaptureSize(self, size):
+
+        filename = cache_path('capture_size.json')
+        try:
+            with open(filename, 'r') as f:
+                sizes = json.load(f)
+        except (OSError, ValueError):
+            sizes = {}
+
+        sizes[self._cap.model] = list(size)
+        try:
+            with open(filename + '.tmp', 'w') as f:
+                json.dump(sizes, f)
+            os.replace(filename + '.tmp', filename)
+        except OSError as e:
+            logging.warn('Could not store picture size: {}'.format(e))
+
+    def checkCaptureSize(self, size):
+
+        # Size as delivered by the camera, i.e., before rotation
+        if size != self._capture_size:
+            # Camera settings changed since the size was negotiated, the
+            # layout is fixed for this session but the next one will be right
+            logging.warn('Picture size %dx%d differs from expected %dx%d',
+                         *size, *self._capture_size)
+            self._capture_size = size
+            self._storeCaptureSize(size)
+
+    def loadThumbnail(self, byte_data):
+
+        shot = Image.open(byte_data)
+
+        # Let libjpeg decode at the smallest power-of-two scale that is still
+        # larger than the thumbnail (size in stored, i.e. unrotated, order)
+        size = self._pic_dims.thumbnailSize
+        if shot.getexif().get(0x0112, 1) in (5, 6, 7, 8):
+            size = size[::-1]
+        shot.draft('RGB', size)
+
+        shot = ImageOps.exif_transpose(shot)
+        return shot.resize(self._pic_dims.thumbnailSize)
+
+    def _newPicture(self):
+
+        self._picture = self._template.copy()
+
+    def _addThumbnail(self, index, byte_data):
+
+        resized = self.loadThumbnail(byte_data)
+        self._picture.paste(resized, self._pic_dims.thumbnailOffset[index])
+
+    def _encodePicture(self):
+
+        start = time.perf_counter()
+        byte_data = BytesIO()
+        self._picture.save(byte_data, format='jpeg', **self._jpeg_options)
+        return byte_data, start, time.perf_counter()
+
     def assemblePicture(self):
 
+        start = time.perf_counter()
+
+        # The executor encodes the picture once the remaining shots are
+        # composited, meanwhile the camera is switched to idle
+        encoded = self._executor.submit(self._encodePicture)
         self.setIdle()
+        idle_end = time.perf_counter()
 
-        picture = self._template.copy()
         for i in range(self._pic_dims.totalNumPictures):
-            shot = Image.open(self._pictures[i])
-            resized = shot.resize(self._pic_dims.thumbnailSize)
-            picture.paste(resized, self._pic_dims.thumbnailOffset[i])
+            self._thumbnails[i].result()
+        byte_data, encode_start, encode_end = encoded.result()
 
-        byte_data = BytesIO()
-        picture.save(byte_data, format='jpeg')
+        blob = self._comm.blobs.put(byte_data.getbuffer())
         self._comm.send(Workers.MASTER,
-                        StateMachine.CameraEvent('review', byte_data))
-        self._pictures = []
+                        StateMachine.CameraEvent('review', blob))
+
+        # Time saved compared to switching to idle before encoding
+        saved = max(min(idle_end, encode_end) - max(start, encode_start), 0)
+        logging.info('Assembled picture in %.0f ms (encoding %.0f ms, '
+                     '%.0f ms saved by encoding in the background)',
+                     (time.perf_counter() - start) * 1000,
+                     (encode_end - encode_start) * 1000, saved * 1000)
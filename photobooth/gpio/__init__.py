@@ -11,6 +11,13 @@ from ..Threading import Workers
 
 class Gpio:
 
+    # States handled by this worker, ErrorState stops the idle animation
+    topics = (StateMachine.IdleState, StateMachine.GreeterState,
+              StateMachine.CountdownState, StateMachine.CaptureState,
+              StateMachine.AssembleState, StateMachine.ReviewState,
+              StateMachine.PostprocessState, StateMachine.ErrorState,
+              StateMachine.TeardownState)
+
     def __init__(self, config, comm):
 
         super().__init__()
@@ -257,7 +257,7 @@ class WaitMessage(GenericFrame):
 
 class CountdownMessage(QtWidgets.QFrame):
 
-    def __init__(self, time, action):
+    def __init__(self, time, action, shown=None):
 
         super().__init__()
         self.setObjectName('CountdownMessage')
@@ -267,6 +267,10 @@ class CountdownMessage(QtWidgets.QFrame):
         self._action = action
         self._picture = None
 
+        # Called once a new picture is being painted
+        self._shown = shown
+        self._is_shown = True
+
         self._initProgressBar(time)
 
     @property
@@ -291,6 +295,7 @@ class CountdownMessage(QtWidgets.QFrame):
             raise ValueError('picture must be a QtGui.QImage')
 
         self._picture = picture
+        self._is_shown = False
 
     def _initProgressBar(self, time):
 
@@ -324,6 +329,11 @@ class CountdownMessage(QtWidgets.QFrame):
         if self.picture is not None:
 
             pix = QtGui.QPixmap.fromImage(self.picture)
+            # The picture is not read anymore once it has been copied
+            if not self._is_shown:
+                self._is_shown = True
+                if self._shown is not None:
+                    self._shown()
             pix = pix.scaled(self.contentsRect().size(),
                              QtCore.Qt.KeepAspectRatio,
                              QtCore.Qt.FastTransformation)
@@ -802,6 +812,16 @@ class Settings(QtWidgets.QFrame):
         pdf.setChecked(self._cfg.getBool('Printer', 'pdf'))
         self.add('Printer', 'pdf', pdf)
 
+        pdf_pages = QtWidgets.QSpinBox()
+        pdf_pages.setRange(1, 9999)
+        pdf_pages.setValue(self._cfg.getInt('Printer', 'pdf_pages'))
+        self.add('Printer', 'pdf_pages', pdf_pages)
+
+        pdf_minutes = QtWidgets.QSpinBox()
+        pdf_minutes.setRange(1, 99999)
+        pdf_minutes.setValue(self._cfg.getInt('Printer', 'pdf_minutes'))
+        self.add('Printer', 'pdf_minutes', pdf_minutes)
+
         confirmation = QtWidgets.QCheckBox()
         confirmation.setChecked(self._cfg.getBool('Printer', 'confirmation'))
         self.add('Printer', 'confirmation', confirmation)
@@ -824,12 +844,40 @@ class Settings(QtWidgets.QFrame):
         lay_size.addWidget(QtWidgets.QLabel('x'))
         lay_size.addWidget(height)
 
+        copies_x = QtWidgets.QSpinBox()
+        copies_x.setRange(1, 99)
+        copies_x.setValue(self._cfg.getInt('Printer', 'copies_x'))
+        copies_y = QtWidgets.QSpinBox()
+        copies_y.setRange(1, 99)
+        copies_y.setValue(self._cfg.getInt('Printer', 'copies_y'))
+        self.add('Printer', 'copies_x', copies_x)
+        self.add('Printer', 'copies_y', copies_y)
+
+        lay_copies = QtWidgets.QHBoxLayout()
+        lay_copies.addWidget(copies_x)
+        lay_copies.addWidget(QtWidgets.QLabel('x'))
+        lay_copies.addWidget(copies_y)
+
+        copies_gap = QtWidgets.QSpinBox()
+        copies_gap.setRange(0, 999999)
+        copies_gap.setValue(self._cfg.getInt('Printer', 'copies_gap'))
+        self.add('Printer', 'copies_gap', copies_gap)
+
+        cut_marks = QtWidgets.QCheckBox()
+        cut_marks.setChecked(self._cfg.getBool('Printer', 'cut_marks'))
+        self.add('Printer', 'cut_marks', cut_marks)
+
         layout = QtWidgets.QFormLayout()
         layout.addRow(_('Enable printing:'), enable)
         layout.addRow(_('Module:'), module)
         layout.addRow(_('Print to PDF (for debugging):'), pdf)
+        layout.addRow(_('Pages per PDF document:'), pdf_pages)
+        layout.addRow(_('Minutes per PDF document:'), pdf_minutes)
         layout.addRow(_('Ask for confirmation before printing:'), confirmation)
         layout.addRow(_('Paper size [mm]:'), lay_size)
+        layout.addRow(_('Copies per sheet:'), lay_copies)
+        layout.addRow(_('Distance between copies [px]:'), copies_gap)
+        layout.addRow(_('Print cut marks:'), cut_marks)
 
         widget = QtWidgets.QWidget()
         widget.setLayout(layout)
@@ -871,6 +919,15 @@ class Settings(QtWidgets.QFrame):
         password = QtWidgets.QLineEdit(self._cfg.get('Mailer', 'password'))
         self.add('Mailer', 'password', password)
 
+        digest_count = QtWidgets.QSpinBox()
+        digest_count.setRange(1, 100)
+        digest_count.setValue(self._cfg.getInt('Mailer', 'digest_count'))
+        self.add('Mailer', 'digest_count', digest_count)
+        digest_time = QtWidgets.QSpinBox()
+        digest_time.setRange(0, 1440)
+        digest_time.setValue(self._cfg.getInt('Mailer', 'digest_time'))
+        self.add('Mailer', 'digest_time', digest_time)
+
         lay_server = QtWidgets.QHBoxLayout()
         lay_server.addWidget(server)
         lay_server.addWidget(QtWidgets.QLabel('Port:'))
@@ -893,6 +950,8 @@ class Settings(QtWidgets.QFrame):
         layout.addRow(_('Mail message:'), message)
         layout.addRow(_('SMTP server:'), lay_server)
         layout.addRow(_('Server requires auth:'), lay_auth)
+        layout.addRow(_('Pictures per mail:'), digest_count)
+        layout.addRow(_('Max. wait for more pictures [min]:'), digest_time)
 
         widget = QtWidgets.QWidget()
         widget.setLayout(layout)
@@ -909,6 +968,15 @@ class Settings(QtWidgets.QFrame):
         url = QtWidgets.QLineEdit(self._cfg.get('UploadWebdav', 'url'))
         self.add('UploadWebdav', 'url', url)
 
+        date_folder = QtWidgets.QCheckBox()
+        date_folder.setChecked(self._cfg.getBool('UploadWebdav',
+                                                 'use_date_folder'))
+        self.add('UploadWebdav', 'use_date_folder', date_folder)
+
+        shots = QtWidgets.QCheckBox()
+        shots.setChecked(self._cfg.getBool('UploadWebdav', 'upload_shots'))
+        self.add('UploadWebdav', 'upload_shots', shots)
+
         use_auth = QtWidgets.QCheckBox()
         use_auth.setChecked(self._cfg.getBool('UploadWebdav', 'use_auth'))
         self.add('UploadWebdav', 'use_auth', use_auth)
@@ -928,6 +996,8 @@ class Settings(QtWidgets.QFrame):
         layout = QtWidgets.QFormLayout()
         layout.addRow(_('Enable WebDAV upload:'), enable)
         layout.addRow(_('URL (folder must exist):'), url)
+        layout.addRow(_('Upload into date folders:'), date_folder)
+        layout.addRow(_('Upload single shots:'), shots)
         layout.addRow(_('Server requires auth:'), lay_auth)
 
         widget = QtWidgets.QWidget()
@@ -1098,6 +1168,10 @@ class Settings(QtWidgets.QFrame):
                       str(self.get('Printer', 'enable').isChecked()))
         self._cfg.set('Printer', 'pdf',
                       str(self.get('Printer', 'pdf').isChecked()))
+        self._cfg.set('Printer', 'pdf_pages',
+                      self.get('Printer', 'pdf_pages').text())
+        self._cfg.set('Printer', 'pdf_minutes',
+                      self.get('Printer', 'pdf_minutes').text())
         self._cfg.set('Printer', 'confirmation',
                       str(self.get('Printer', 'confirmation').isChecked()))
         self._cfg.set('Printer', 'module',
@@ -1106,6 +1180,14 @@ class Settings(QtWidgets.QFrame):
         self._cfg.set('Printer', 'width', self.get('Printer', 'width').text())
         self._cfg.set('Printer', 'height',
                       self.get('Printer', 'height').text())
+        self._cfg.set('Printer', 'copies_x',
+                      self.get('Printer', 'copies_x').text())
+        self._cfg.set('Printer', 'copies_y',
+                      self.get('Printer', 'copies_y').text())
+        self._cfg.set('Printer', 'copies_gap',
+                      self.get('Printer', 'copies_gap').text())
+        self._cfg.set('Printer', 'cut_marks',
+                      str(self.get('Printer', 'cut_marks').isChecked()))
 
         self._cfg.set('Mailer', 'enable',
                       str(self.get('Mailer', 'enable').isChecked()))
@@ -1125,11 +1207,20 @@ class Settings(QtWidgets.QFrame):
         self._cfg.set('Mailer', 'user', self.get('Mailer', 'user').text())
         self._cfg.set('Mailer', 'password',
                       self.get('Mailer', 'password').text())
+        self._cfg.set('Mailer', 'digest_count',
+                      self.get('Mailer', 'digest_count').text())
+        self._cfg.set('Mailer', 'digest_time',
+                      self.get('Mailer', 'digest_time').text())
 
         self._cfg.set('UploadWebdav', 'enable',
                       str(self.get('UploadWebdav', 'enable').isChecked()))
         self._cfg.set('UploadWebdav', 'url',
                       self.get('UploadWebdav', 'url').text())
+        self._cfg.set('UploadWebdav', 'use_date_folder',
+                      str(self.get('UploadWebdav',
+                                   'use_date_folder').isChecked()))
+        self._cfg.set('UploadWebdav', 'upload_shots',
+                      str(self.get('UploadWebdav', 'upload_shots').isChecked()))
         self._cfg.set('UploadWebdav', 'use_auth',
                       str(self.get('UploadWebdav', 'use_auth').isChecked()))
         self._cfg.set('UploadWebdav', 'user',
@@ -23,9 +23,11 @@ import os
 from PyQt5 import QtCore
 from PyQt5 import QtGui
 from PyQt5 import QtWidgets
+from PyQt5 import sip
 
 from PIL import Image, ImageQt
 
+from ...SharedMemory import FrameRing
 from ...StateMachine import GuiEvent, TeardownEvent
 from ...Threading import Workers
 
@@ -50,6 +52,7 @@ class PyQt5Gui(GuiSkeleton):
         self._initWorker()
 
         self._picture = None
+        self._preview = None
 
     def run(self):
 
@@ -91,6 +94,11 @@ class PyQt5Gui(GuiSkeleton):
         self._receiver.notify.connect(self.handleState)
         self._receiver.start()
 
+        # Preview frames bypass the state queue via the preview mailbox
+        self._preview_receiver = Receiver.PreviewReceiver(self._comm.preview)
+        self._preview_receiver.notify.connect(self._handlePreview)
+        self._preview_receiver.start()
+
     def _initWorker(self):
 
         # Create worker thread for time consuming tasks to keep gui responsive
@@ -128,6 +136,11 @@ class PyQt5Gui(GuiSkeleton):
             self._comm.send(Workers.MASTER, GuiEvent('welcome'))
         elif state.target in (TeardownEvent.EXIT, TeardownEvent.RESTART):
             self._worker.put(None)
+            self._comm.preview.close()
+            self._preview_receiver.ready()
+            if self._preview is not None:
+                self._preview.close()
+                self._preview = None
             self._app.exit(0)
 
     def showError(self, state):
@@ -211,12 +224,32 @@ class PyQt5Gui(GuiSkeleton):
         countdown_time = self._cfg.getInt('Photobooth', 'countdown_time')
         self._setWidget(Frames.CountdownMessage(
             countdown_time,
-            lambda: self._comm.send(Workers.MASTER, GuiEvent('capture'))))
+            lambda: self._comm.send(Workers.MASTER, GuiEvent('capture')),
+            self._preview_receiver.ready))
 
     def updateCountdown(self, event):
 
-        picture = Image.open(event.picture)
-        self._gui.centralWidget().picture = ImageQt.ImageQt(picture)
+        # Frames may still arrive after the countdown has finished
+        if not isinstance(self._gui.centralWidget(), Frames.CountdownMessage):
+            self._preview_receiver.ready()
+            return
+
+        frame = event.picture
+        if self._preview is None or self._preview.name != frame.name:
+            # The camera creates a new ring on every startup. The widget
+            # gets the new picture below before it is painted again.
+            if self._preview is not None:
+                self._preview.close()
+            self._preview = FrameRing.attach(frame)
+
+        # Wrap the shared memory slot without copying or decoding it
+        width, height = frame.size
+        picture = QtGui.QImage(sip.voidptr(self._preview.view(frame)),
+                               width, height, 3 * width,
+                               QtGui.QImage.Format_RGB888)
+        # The widget signals ready() once it has painted the picture. Only
+        # then the next frame is fetched and the camera may reuse slots.
+        self._gui.centralWidget().picture = picture
         self._gui.centralWidget().update()
 
     def showCapture(self, state):
@@ -251,6 +284,14 @@ class PyQt5Gui(GuiSkeleton):
     def showPostprocess(self, state):
         Frames.PostprocessMessage(self._gui.centralWidget())
 
+    def _handlePreview(self, event):
+
+        try:
+            self.handleState(event)
+        except Exception:
+            self._preview_receiver.ready()
+            raise
+
     def _handleKeypressEvent(self, event):
 
         if self._is_escape and event.key() == QtCore.Qt.Key_Escape:
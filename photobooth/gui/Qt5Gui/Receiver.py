@@ -17,6 +17,8 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 
+import threading
+
 from PyQt5 import QtCore
 
 from ...Threading import Workers
@@ -37,5 +39,30 @@ class Receiver(QtCore.QThread):
 
     def run(self):
 
-        for state in self._comm.iter(Workers.GUI):
+        # States are handled in the GUI thread after being passed on
+        for state in self._comm.iter(Workers.GUI, prefetch=True):
             self.handle(state)
+
+
+class PreviewReceiver(QtCore.QThread):
+
+    notify = QtCore.pyqtSignal(object)
+
+    def __init__(self, mailbox):
+
+        super().__init__()
+        self._mailbox = mailbox
+        self._ready = threading.Event()
+
+    def ready(self):
+
+        self._ready.set()
+
+    def run(self):
+
+        for event in iter(self._mailbox.get, None):
+            self._ready.clear()
+            self.notify.emit(event)
+            # Fetch the next frame only once the GUI has painted this one,
+            # newer frames replace older ones in the mailbox meanwhile
+            self._ready.wait(1)
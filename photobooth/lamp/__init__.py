@@ -143,6 +143,10 @@ class Relay(object):
 
 class LampWorker:
 
+    # States handled by this worker
+    topics = (StateMachine.StartupState, StateMachine.CountdownState,
+              StateMachine.AssembleState, StateMachine.TeardownState)
+
     def __init__(self, config, comm):
 
         super().__init__()
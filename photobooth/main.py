@@ -185,6 +185,16 @@ def run(argv, is_run):
     config = Config('photobooth.cfg')
 
     comm = Communicator()
+
+    # Broadcast to every worker only the states it actually handles
+    comm.subscribe(Workers.CAMERA, camera.Camera.topics)
+    comm.subscribe(Workers.GPIO, Gpio.topics)
+    comm.subscribe(Workers.WORKER, Worker.topics)
+    if config.getBool('Relay', 'enable'):
+        comm.subscribe(Workers.LAMP, LampWorker.topics)
+    else:
+        comm.subscribe(Workers.LAMP, ())
+
     context = Context(comm, is_run)
 
     # Initialize processes: We use five/six processes here:
@@ -209,6 +219,13 @@ def run(argv, is_run):
     for proc in procs:
         proc.join()
 
+    # Free any shared payloads still referenced by the last states
+    comm.blobs.clear()
+
+    for worker in list(Workers)[1:]:
+        logging.debug('%s: %d broadcasts not delivered', worker.name,
+                      comm.skipped(worker))
+
     logging.debug('All processes joined, returning code {}'. format(exit_code))
 
     return exit_code
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from PIL import Image, ImageDraw
+
+
+class Imposition:
+    """
+    Arranges copies of the assembled picture on a print sheet.
+
+    The copies are pasted into the sheet as they are, i.e., the picture is
+    not resampled a second time. E.g., two 2x6" photo strips on a 4x6"
+    sheet are two copies side by side, 2-up postcards are two copies on
+    top of each other. The sheet of the latest picture is cached by a key
+    supplied by the caller, so printing it again costs nothing.
+
+    Args:
+      copies (tuple): Number of copies in horizontal and vertical direction
+      gap (int): Distance between the copies in pixels
+      cut_marks (bool): Mark the cut lines at the edges of the sheet
+    """
+
+    def __init__(self, copies=(1, 1), gap=0, cut_marks=False):
+
+        if (not isinstance(copies, (list, tuple)) or len(copies) != 2 or
+                min(copies) < 1):
+            raise ValueError('copies must be a list/tuple of two positive '
+                             'numbers')
+        if gap < 0:
+            raise ValueError('gap must not be negative')
+
+        self._copies = tuple(copies)
+        self._gap = gap
+        self._cut_marks = cut_marks
+
+        self._key = None
+        self._sheet = None
+
+    @classmethod
+    def fromConfig(cls, config):
+        """Create the imposition given by the [Printer] options"""
+        return cls((config.getInt('Printer', 'copies_x'),
+                    config.getInt('Printer', 'copies_y')),
+                   config.getInt('Printer', 'copies_gap'),
+                   config.getBool('Printer', 'cut_marks'))
+
+    def __getstate__(self):
+
+        # The cached sheet is not sent to other processes
+        state = self.__dict__.copy()
+        state['_key'] = None
+        state['_sheet'] = None
+        return state
+
+    @property
+    def isSingle(self):
+        """True if the sheet is the picture itself"""
+        return self._copies == (1, 1)
+
+    def sheetSize(self, size):
+        """Return the size of the sheet for a picture of the given size"""
+        return tuple(n * s + (n - 1) * self._gap
+                     for n, s in zip(self._copies, size))
+
+    def impose(self, picture, key=None):
+        """Return the sheet for picture (PIL image), cached by key"""
+        if self.isSingle:
+            return picture
+        if key is not None and key == self._key:
+            return self._sheet
+
+        width, height = picture.size
+        sheet = Image.new(picture.mode, self.sheetSize(picture.size), 'white')
+        for i in range(self._copies[0]):
+            for j in range(self._copies[1]):
+                sheet.paste(picture, (i * (width + self._gap),
+                                      j * (height + self._gap)))
+
+        if self._cut_marks:
+            self._drawCutMarks(sheet, picture.size)
+
+        self._key, self._sheet = key, sheet
+        return sheet
+
+    def _drawCutMarks(self, sheet, size):
+
+        # Short lines at both ends of every cut between the copies
+        draw = ImageDraw.Draw(sheet)
+        length = max(sheet.size) // 50
+        line = min(max(self._gap, 1), 3)
+        sheet_width, sheet_height = sheet.size
+
+        for i in range(1, self._copies[0]):
+            x = i * (size[0] + self._gap) - (self._gap + 1) // 2
+            draw.line([(x, 0), (x, length)], 'black', line)
+            draw.line([(x, sheet_height - 1 - length), (x, sheet_height - 1)],
+                      'black', line)
+
+        for j in range(1, self._copies[1]):
+            y = j * (size[1] + self._gap) - (self._gap + 1) // 2
+            draw.line([(0, y), (length, y)], 'black', line)
+            draw.line([(sheet_width - 1 - length, y), (sheet_width - 1, y)],
+                      'black', line)
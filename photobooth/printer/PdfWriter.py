@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import os
+import time
+
+from io import BytesIO
+
+from PIL import Image
+
+
+class PdfWriter:
+    """
+    Writes JPEG pictures as pages into rolling multi-page PDF documents.
+
+    The JPEG data is embedded as is (DCTDecode), i.e., without decoding
+    and re-encoding it. Every page is appended as an incremental update
+    with its own cross-reference section, so the document is complete and
+    readable after each page, also if the photobooth is stopped. A new
+    document is started once the current one has reached the maximum
+    number of pages or age. Documents are named after their creation time
+    and never overwrite existing files.
+
+    Args:
+      page_size (tuple): Page width and height in mm
+      directory (str): Directory for the documents
+      max_pages (int): Maximum number of pages per document
+      max_minutes (float): Maximum time in minutes to add pages to a
+        document
+    """
+
+    # Color spaces for the PIL modes of JPEG pictures
+    color_spaces = {'L': b'/DeviceGray', 'RGB': b'/DeviceRGB',
+                    'CMYK': b'/DeviceCMYK'}
+
+    def __init__(self, page_size, directory='.', max_pages=50,
+                 max_minutes=60):
+
+        # Page size in points
+        self._page_size = tuple(size * 72 / 25.4 for size in page_size)
+        self._directory = directory
+        self._max_pages = max_pages
+        self._max_time = max_minutes * 60
+
+        self._file = None
+
+    def _open(self):
+
+        name = time.strftime('print_%Y-%m-%d_%H-%M-%S')
+        for i in range(1000):
+            filename = os.path.join(self._directory, '{}{}.pdf'.format(
+                name, '_{}'.format(i) if i > 0 else ''))
+            try:
+                self._file = open(filename, 'xb')
+                break
+            except FileExistsError:
+                continue
+        else:
+            raise RuntimeError('No unused filename for ' + name)
+
+        logging.info('Writing prints to "%s"', filename)
+        self._filename = filename
+        self._started = time.monotonic()
+        self._pages = []
+        self._offsets = {}
+        self._xref = None
+
+        # Object 1 is the catalog, object 2 the page tree that is updated
+        # for every page
+        self._file.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        self._writeObject(1, b'<< /Type /Catalog /Pages 2 0 R >>')
+
+    def close(self):
+
+        if self._file is not None:
+            logging.info('Closing "%s" with %d pages', self._filename,
+                         len(self._pages))
+            self._file.close()
+            self._file = None
+
+    def _writeObject(self, number, content, stream=None):
+
+        self._offsets[number] = self._file.tell()
+        self._file.write(b'%d 0 obj\n' % number)
+        self._file.write(content)
+        if stream is not None:
+            self._file.write(b'\nstream\n')
+            self._file.write(stream)
+            self._file.write(b'\nendstream')
+        self._file.write(b'\nendobj\n')
+
+    def _writeXref(self, numbers):
+
+        # One subsection per run of consecutive object numbers
+        offset = self._file.tell()
+        lines = [b'xref\n']
+        if self._xref is None:
+            lines.append(b'0 1\n0000000000 65535 f \n')
+        numbers = sorted(numbers)
+        start = 0
+        for i in range(1, len(numbers) + 1):
+            if i == len(numbers) or numbers[i] != numbers[i - 1] + 1:
+                lines.append(b'%d %d\n' % (numbers[start], i - start))
+                lines.extend(b'%010d 00000 n \n' % self._offsets[number]
+                             for number in numbers[start:i])
+                start = i
+
+        size = max(self._offsets) + 1
+        if self._xref is None:
+            trailer = b'<< /Size %d /Root 1 0 R >>' % size
+        else:
+            trailer = b'<< /Size %d /Root 1 0 R /Prev %d >>' % (size,
+                                                                self._xref)
+        lines.append(b'trailer\n%s\nstartxref\n%d\n%%%%EOF\n' % (trailer,
+                                                                offset))
+        self._file.write(b''.join(lines))
+        self._xref = offset
+
+    def addPage(self, data):
+        """Append a page showing the JPEG picture data (bytes-like)"""
+        picture = Image.open(BytesIO(data))
+        if picture.format != 'JPEG':
+            raise ValueError('Picture must be a JPEG')
+        if picture.mode not in self.color_spaces:
+            raise ValueError('Unsupported JPEG mode "{}"'.format(picture.mode))
+
+        if self._file is not None and (
+                len(self._pages) >= self._max_pages or
+                time.monotonic() - self._started >= self._max_time):
+            self.close()
+        if self._file is None:
+            self._open()
+
+        width, height = self._page_size
+        image = max(max(self._offsets), 2) + 1
+        content, page = image + 1, image + 2
+
+        dictionary = (b'<< /Type /XObject /Subtype /Image /Width %d '
+                      b'/Height %d /ColorSpace %s /BitsPerComponent 8 '
+                      b'/Filter /DCTDecode' % (picture.width, picture.height,
+                                               self.color_spaces[picture.mode]))
+        if picture.mode == 'CMYK':
+            # Adobe stores CMYK JPEGs inverted
+            dictionary += b' /Decode [1 0 1 0 1 0 1 0]'
+        self._writeObject(image, dictionary + b' /Length %d >>' % len(data),
+                          bytes(data))
+
+        # Scale the picture to the full page
+        stream = b'q %.2f 0 0 %.2f 0 0 cm /Im0 Do Q' % (width, height)
+        self._writeObject(content, b'<< /Length %d >>' % len(stream), stream)
+
+        self._writeObject(page, b'<< /Type /Page /Parent 2 0 R /MediaBox '
+                          b'[0 0 %.2f %.2f] /Resources << /XObject << /Im0 '
+                          b'%d 0 R >> >> /Contents %d 0 R >>' % (
+                              width, height, image, content))
+        self._pages.append(page)
+
+        kids = b' '.join(b'%d 0 R' % number for number in self._pages)
+        self._writeObject(2, b'<< /Type /Pages /Kids [%s] /Count %d >>' % (
+            kids, len(self._pages)))
+
+        updated = (2, image, content, page)
+        self._writeXref(updated if len(self._pages) > 1 else
+                        (1,) + updated)
+        self._file.flush()
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import threading
+import time
+
+from collections import deque
+from concurrent.futures import Future
+
+import cups
+
+
+class PrintSpooler:
+    """
+    Queue of print jobs that are sent to CUPS in the background.
+
+    Every job brings its own buffer, which is streamed to CUPS over a
+    persistent connection, so no temporary files are involved and callers
+    never wait for the printer. Jobs are queued without limit and kept
+    until CUPS accepted them: if CUPS is not reachable, they are retried
+    in order once it is back. Accepted jobs are polled until they are
+    completed, which resolves the Future returned by submit() with the
+    job's latency in seconds.
+
+    Jobs that are still printing when the spooler is closed are no longer
+    tracked, i.e., their futures are not resolved.
+
+    Args:
+      printer (str): Name of the CUPS printer
+      poll_interval (float): Time in seconds between job state updates
+      retry_interval (float): Time in seconds before reconnecting to CUPS
+    """
+
+    chunk_size = 64 * 1024
+
+    def __init__(self, printer, poll_interval=2, retry_interval=10):
+
+        self._printer = printer
+        self._poll_interval = poll_interval
+        self._retry_interval = retry_interval
+
+        # The connection is owned by the spooler thread
+        self._conn = None
+        self._last_poll = 0
+
+        self._queue = deque()
+        self._printing = {}
+        self._condition = threading.Condition()
+        self._is_running = True
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @property
+    def queued(self):
+        """Number of jobs not yet accepted by CUPS"""
+        with self._condition:
+            return len(self._queue)
+
+    @property
+    def printing(self):
+        """Number of jobs accepted by CUPS but not yet completed"""
+        with self._condition:
+            return len(self._printing)
+
+    def submit(self, data, title='photobooth', options=None,
+               format='image/jpeg'):
+        """Queue data (bytes-like) for printing and return a Future"""
+        job = {'data': bytes(data), 'title': title,
+               'options': options if options is not None else {},
+               'format': format, 'submitted': time.monotonic(),
+               'future': Future()}
+
+        with self._condition:
+            if not self._is_running:
+                raise RuntimeError('PrintSpooler is closed')
+            self._queue.append(job)
+            depth = len(self._queue) + len(self._printing)
+            self._condition.notify()
+
+        logging.debug('Queued print job "%s" on %s (%d jobs in queue)',
+                      title, self._printer, depth)
+        return job['future']
+
+    def close(self):
+        """Send all queued jobs and stop the spooler"""
+        with self._condition:
+            self._is_running = False
+            self._condition.notify()
+
+        self._thread.join()
+
+    def _run(self):
+
+        while True:
+            with self._condition:
+                if self._is_running and len(self._queue) == 0:
+                    self._condition.wait(
+                        self._poll_interval if self._printing else None)
+                if not self._is_running and len(self._queue) == 0:
+                    break
+                job = self._queue[0] if self._queue else None
+
+            try:
+                if self._conn is None:
+                    self._conn = cups.Connection()
+                if job is not None:
+                    self._send(job)
+                if time.monotonic() - self._last_poll >= self._poll_interval:
+                    self._poll()
+            except (RuntimeError, cups.HTTPError) as e:
+                self._reconnect(e)
+            except cups.IPPError as e:
+                status = e.args[0] if e.args else None
+                if status in (cups.IPP_SERVICE_UNAVAILABLE,
+                              cups.IPP_NOT_ACCEPTING):
+                    self._reconnect(e)
+                elif job is not None and job.get('id') is None:
+                    # The job itself was rejected
+                    logging.error('Print job "%s" rejected: %s',
+                                  job['title'], e)
+                    with self._condition:
+                        self._queue.popleft()
+                    job['future'].set_exception(e)
+                else:
+                    logging.error('Could not update print jobs: %s', e)
+
+        if len(self._printing) > 0:
+            logging.info('Stopped tracking %d print jobs', len(self._printing))
+
+    def _reconnect(self, error):
+
+        logging.warn('CUPS not available, retrying in %d s (%d jobs '
+                     'queued): %s', self._retry_interval, self.queued, error)
+        self._conn = None
+        with self._condition:
+            if self._is_running:
+                self._condition.wait(self._retry_interval)
+            elif len(self._queue) > 0:
+                # Do not retry forever on shutdown
+                logging.error('Dropping %d print jobs', len(self._queue))
+                for job in self._queue:
+                    job['future'].set_exception(RuntimeError(
+                        'PrintSpooler closed before job was sent'))
+                self._queue.clear()
+
+    def _send(self, job):
+
+        conn = self._conn
+        job_id = conn.createJob(self._printer, job['title'], job['options'])
+        try:
+            status = conn.startDocument(self._printer, job_id, job['title'],
+                                        job['format'], 1)
+            if status != cups.HTTP_CONTINUE:
+                raise cups.HTTPError(status)
+
+            data = job['data']
+            for offset in range(0, len(data), self.chunk_size):
+                chunk = data[offset:offset + self.chunk_size]
+                status = conn.writeRequestData(chunk, len(chunk))
+                if status != cups.HTTP_CONTINUE:
+                    raise cups.HTTPError(status)
+
+            conn.finishDocument(self._printer)
+        except Exception:
+            # Do not leave an incomplete job behind, it is sent again
+            try:
+                conn.cancelJob(job_id)
+            except Exception:
+                pass
+            raise
+
+        job['id'] = job_id
+        job['data'] = None
+        with self._condition:
+            self._queue.popleft()
+            self._printing[job_id] = job
+
+        logging.info('Sent print job %d "%s" to %s after %.1f s', job_id,
+                     job['title'], self._printer,
+                     time.monotonic() - job['submitted'])
+
+    def _poll(self):
+
+        self._last_poll = time.monotonic()
+        for job_id, job in list(self._printing.items()):
+            try:
+                state = self._conn.getJobAttributes(
+                    job_id, requested_attributes=['job-state'])['job-state']
+            except cups.IPPError as e:
+                if not e.args or e.args[0] != cups.IPP_NOT_FOUND:
+                    raise
+                # Only finished jobs are purged from the history
+                state = cups.IPP_JOB_COMPLETED
+            if state not in (cups.IPP_JOB_COMPLETED, cups.IPP_JOB_CANCELED,
+                             cups.IPP_JOB_ABORTED):
+                continue
+
+            with self._condition:
+                del self._printing[job_id]
+                depth = len(self._queue) + len(self._printing)
+
+            latency = time.monotonic() - job['submitted']
+            if state == cups.IPP_JOB_COMPLETED:
+                logging.info('Print job %d completed after %.1f s (%d jobs '
+                             'in queue)', job_id, latency, depth)
+                job['future'].set_result(latency)
+            else:
+                logging.error('Print job %d was cancelled or aborted',
+                              job_id)
+                job['future'].set_exception(RuntimeError(
+                    'Print job {} failed'.format(job_id)))
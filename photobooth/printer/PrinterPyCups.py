@@ -5,11 +5,14 @@
 # @oelegeirnaert (https://github.com/oelegeirnaert)
 # see https://github.com/reuterbal/photobooth/pull/113
 
+import hashlib
 import logging
-import os
+
+from io import BytesIO
 
 try:
     import cups
+    from .PrintSpooler import PrintSpooler
 except ImportError:
     logging.error('pycups is not installed')
     cups = None
@@ -17,11 +20,18 @@ except ImportError:
 from PIL import ImageQt
 
 from . import Printer
+from .Imposition import Imposition
 
 
 class PrinterPyCups(Printer):
 
-    def __init__(self, page_size, print_pdf=False):
+    def __init__(self, page_size, print_pdf=False, pdf_pages=50,
+                 pdf_minutes=60, imposition=None):
+
+        # Copies of the picture per sheet
+        if imposition is None:
+            imposition = Imposition()
+        self._imposition = imposition
 
         self._conn = cups.Connection() if cups else None
 
@@ -29,22 +39,23 @@ class PrinterPyCups(Printer):
             logging.error('Printing to PDF not supported with pycups')
             self._conn = None
 
-        if os.access('/dev/shm', os.W_OK):
-            self._tmp_filename = '/dev/shm/print.jpg'
-        else:
-            self._tmp_filename = '/tmp/print.jpg'
-        logging.debug('Storing temp files to "{}"'.format(self._tmp_filename))
-
         if self._conn is not None:
             self._printer = self._conn.getDefault()
             logging.info('Using printer "%s"', self._printer)
+            # Jobs are sent in the background, each with its own buffer
+            self._spooler = PrintSpooler(self._printer)
 
     def print(self, picture):
 
         if self._conn is not None:
             if isinstance(picture, ImageQt.ImageQt):
-                picture.save(self._tmp_filename)
-            else:
-                picture.save(self._tmp_filename, format='JPEG')
-            self._conn.printFile(self._printer, self._tmp_filename,
-                                 "photobooth", {})
+                picture = ImageQt.fromqimage(picture)
+            if not self._imposition.isSingle:
+                # Reprints of the same picture reuse the cached sheet
+                picture = self._imposition.impose(
+                    picture, hashlib.sha1(picture.tobytes()).digest())
+            data = BytesIO()
+            picture.save(data, format='JPEG')
+            self._spooler.submit(data.getbuffer())
+            logging.info('Print queue: %d queued, %d printing',
+                         self._spooler.queued, self._spooler.printing)
@@ -1,20 +1,44 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import hashlib
 import logging
+import time
 
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from PIL import Image
 from PyQt5 import QtCore, QtGui
 from PyQt5.QtPrintSupport import QPrinter
 
 from . import Printer
+from .Imposition import Imposition
+from .PdfWriter import PdfWriter
+
+
+def rasterize(data, size, mode, imposition):
+    """Decode the picture and convert it to the raster for the page"""
+    picture = Image.open(BytesIO(data))
+    # Gaps and cut marks are given in pixels of the full-size picture
+    if imposition.isSingle:
+        picture.draft(mode, size)
+    sheet = imposition.impose(picture.convert(mode))
+    return sheet.resize(size, Image.LANCZOS).tobytes()
 
 
 class PrinterPyQt5(Printer):
 
-    def __init__(self, page_size, print_pdf=False):
+    def __init__(self, page_size, print_pdf=False, pdf_pages=50,
+                 pdf_minutes=60, imposition=None):
 
         super().__init__(page_size)
 
+        # Copies of the picture per sheet
+        if imposition is None:
+            imposition = Imposition()
+        self._imposition = imposition
+
         self._printer = QPrinter(QPrinter.HighResolution)
         self._printer.setFullPage(True)
         self._printer.setPageSize(QtGui.QPageSize(QtCore.QSizeF(*page_size),
@@ -23,23 +47,119 @@ class PrinterPyQt5(Printer):
 
         logging.info('Using printer "%s"', self._printer.printerName())
 
+        # PDF output collects the pictures as pages of a few documents
         self._print_pdf = print_pdf
         if self._print_pdf:
             logging.info('Using PDF printer')
-            self._counter = 0
-            self._printer.setOutputFormat(QPrinter.PdfFormat)
+            self._pdf = PdfWriter(page_size, max_pages=pdf_pages,
+                                  max_minutes=pdf_minutes)
+
+        # Rasterization runs in a separate process, started on first use
+        self._pool = None
+        self._prepared = None
+
+        # The raster of the latest picture is kept for reprints, as the
+        # imposition's cache does not outlive the trip to the pool process
+        self._raster = None
+
+    def prepare(self, picture):
+
+        # PDF pages embed the encoded picture, or the encoded sheet
+        if self._print_pdf:
+            self._prepared = bytes(picture)
+            if not self._imposition.isSingle:
+                sheet = self._imposition.impose(
+                    Image.open(BytesIO(self._prepared)),
+                    hashlib.sha1(self._prepared).digest())
+                data = BytesIO()
+                sheet.save(data, format='JPEG', quality=95)
+                self._prepared = data.getvalue()
+            return
+
+        # Raster of the full page at the printer's resolution
+        rect = self._printer.pageRect()
+        size = (rect.width(), rect.height())
+        if self._printer.colorMode() == QPrinter.Color:
+            mode, format = 'RGB', QtGui.QImage.Format_RGB888
+        else:
+            mode, format = 'L', QtGui.QImage.Format_Grayscale8
+
+        key = (hashlib.sha1(picture).digest(), size, mode)
+        if self._raster is not None and self._raster[0] == key:
+            logging.info('Using cached print raster')
+            self._prepared = self._raster[1]
+            return
+
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=1)
+        logging.info('Preparing print raster of %dx%d pixels', *size)
+        self._prepared = (size, mode, format, self._pool.submit(
+            rasterize, bytes(picture), size, mode, self._imposition))
+        self._raster = (key, self._prepared)
+
+    def _takePrepared(self):
+
+        if self._prepared is None:
+            return None
+
+        size, mode, format, future = self._prepared
+        self._prepared = None
+        try:
+            data = future.result()
+        except Exception as e:
+            logging.warn('Could not use prepared print raster: %s', e)
+            self._raster = None
+            return None
+
+        # The image references data, which must live as long as the image
+        bytes_per_line = size[0] * len(mode)
+        return data, QtGui.QImage(data, *size, bytes_per_line, format)
+
+    def _encode(self, picture, format):
+
+        buffer = QtCore.QBuffer()
+        buffer.open(QtCore.QIODevice.WriteOnly)
+        picture.save(buffer, format)
+        return bytes(buffer.data())
+
+    def printPdf(self, picture):
+
+        data, self._prepared = self._prepared, None
+        if data is None:
+            data = self._encode(picture, 'JPEG')
+
+        self._pdf.addPage(data)
 
     def print(self, picture):
 
+        start = time.perf_counter()
+
+        # Sheets are always built from the encoded picture
+        if not self._imposition.isSingle and self._prepared is None:
+            self.prepare(self._encode(picture, 'BMP'))
+
         if self._print_pdf:
-            self._printer.setOutputFileName('print_%d.pdf' % self._counter)
-            self._counter += 1
+            self.printPdf(picture)
+            logging.info('Printed picture to PDF in %.0f ms',
+                         (time.perf_counter() - start) * 1000)
+            return
 
         logging.info('Printing picture')
         logging.debug('Page Size: {}, Print Size: {}, PictureSize: {} '.format(
             self._printer.paperRect(), self._printer.pageRect(),
             picture.rect()))
 
+        # A prepared raster is drawn as is, otherwise the picture is scaled
+        # to the page while printing
+        prepared = self._takePrepared()
         painter = QtGui.QPainter(self._printer)
-        painter.drawImage(self._printer.pageRect(), picture, picture.rect())
+        if prepared is not None:
+            painter.drawImage(self._printer.pageRect().topLeft(), prepared[1])
+        else:
+            painter.drawImage(self._printer.pageRect(), picture,
+                              picture.rect())
         painter.end()
+
+        logging.info('Printed %s picture in %.0f ms',
+                     'prepared' if prepared is not None else 'unprepared',
+                     (time.perf_counter() - start) * 1000)
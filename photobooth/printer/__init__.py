@@ -7,6 +7,21 @@ modules = (
     ('PyCUPS', 'PrinterPyCups', 'PrinterPyCups'))
 
 
+def create(config):
+    """Create the printer given by the [Printer] options"""
+    from ..util import lookup_and_import
+    from .Imposition import Imposition
+
+    module = lookup_and_import(modules, config.get('Printer', 'module'),
+                               'printer')
+    return module((config.getInt('Printer', 'width'),
+                   config.getInt('Printer', 'height')),
+                  config.getBool('Printer', 'pdf'),
+                  pdf_pages=config.getInt('Printer', 'pdf_pages'),
+                  pdf_minutes=config.getInt('Printer', 'pdf_minutes'),
+                  imposition=Imposition.fromConfig(config))
+
+
 class Printer:
 
     def __init__(self, page_size):
@@ -26,6 +41,11 @@ class Printer:
 
         self._page_size = page_size
 
+    def prepare(self, picture):
+        """Prepare printing the picture (encoded bytes) that is shown for
+        review, so that print() has less work to do"""
+        pass
+
     def print(self, picture):
 
         raise NotImplementedError('print function not implemented!')
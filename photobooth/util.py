@@ -2,6 +2,8 @@
 # -*- coding: utf-8 -*-
 
 import importlib
+import os
+import struct
 
 from PIL import Image
 
@@ -24,6 +26,16 @@ def lookup_and_import(module_list, name, package=None):
         return getattr(import_module, result[1])
 
 
+def cache_path(filename):
+
+    # Cached data is stored in the user's cache directory
+    basedir = os.environ.get('XDG_CACHE_HOME',
+                             os.path.join(os.path.expanduser('~'), '.cache'))
+    directory = os.path.join(basedir, 'photobooth')
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, filename)
+
+
 def pickle_image(image):
 
     if image is None:
@@ -40,3 +52,80 @@ def unpickle_image(image_data):
     else:
         image = Image.frombytes(*image_data)
         return image
+
+
+# EXIF orientation values for a clockwise rotation (in degrees) required to
+# display the stored picture data
+_exif_orientations = {0: 1, 90: 6, 180: 3, 270: 8}
+
+
+def _find_exif(data):
+
+    # Walk the marker segments in front of the image data and return the
+    # offset of the TIFF header inside the EXIF APP1 segment, if any
+    pos = 2
+    while pos + 4 <= len(data) and data[pos] == 0xFF:
+        marker = data[pos + 1]
+        if marker == 0xDA:
+            break
+        length = struct.unpack('>H', data[pos + 2:pos + 4])[0]
+        if marker == 0xE1 and data[pos + 4:pos + 10] == b'Exif\x00\x00':
+            return pos + 10
+        pos += 2 + length
+
+    return None
+
+
+def rotate_jpeg(data, angle):
+    """
+    Rotate a JPEG losslessly by setting its EXIF orientation tag.
+
+    The rotation is relative to the stored picture data, i.e., any
+    orientation set by the camera is replaced.
+
+    Args:
+        data (bytes): Encoded JPEG picture
+        angle (int): Counter-clockwise rotation in degrees (multiple of 90)
+
+    Returns:
+        bytes: The rotated JPEG, or None if the picture cannot be rotated
+        without re-encoding it.
+    """
+    if data[:2] != b'\xff\xd8':
+        return None
+
+    data = bytearray(data)
+    tiff = _find_exif(data)
+    orientation = _exif_orientations[(360 - angle) % 360]
+
+    if tiff is None:
+        if orientation == 1:
+            return bytes(data)
+
+        # Insert a minimal EXIF segment containing only the orientation
+        exif = (b'Exif\x00\x00' + b'MM\x00\x2a' + struct.pack('>I', 8) +
+                struct.pack('>HHHIHHI', 1, 0x0112, 3, 1, orientation, 0, 0))
+        segment = b'\xff\xe1' + struct.pack('>H', len(exif) + 2) + exif
+        return bytes(data[:2] + segment + data[2:])
+
+    if data[tiff:tiff + 2] == b'II':
+        order = '<'
+    elif data[tiff:tiff + 2] == b'MM':
+        order = '>'
+    else:
+        return None
+
+    ifd = tiff + struct.unpack(order + 'I', data[tiff + 4:tiff + 8])[0]
+    count = struct.unpack(order + 'H', data[ifd:ifd + 2])[0]
+    for i in range(count):
+        entry = ifd + 2 + 12 * i
+        tag, typ = struct.unpack(order + 'HH', data[entry:entry + 4])
+        if tag == 0x0112 and typ == 3:
+            data[entry + 8:entry + 10] = struct.pack(order + 'H', orientation)
+            return bytes(data)
+
+    if orientation == 1:
+        return bytes(data)
+
+    # Adding a tag to an existing EXIF block would require rewriting it
+    return None
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import os
+
+from io import BytesIO
+
+from PIL import Image
+
+from .WorkerTask import WorkerTask
+
+
+class Derivatives(WorkerTask):
+    """
+    Scaled-down versions of the assembled pictures.
+
+    The assembled picture has print resolution already and serves as the
+    print version. The web and thumbnail versions are decoded at reduced
+    scale (JPEG DCT scaling), which is much faster than decoding the full
+    picture and scaling it down afterwards. They are stored next to the
+    picture with the version name appended to the filename.
+    """
+
+    def __init__(self, config, store):
+
+        super().__init__()
+
+        self._store = store
+        self._quality = config.getInt('Derivatives', 'quality')
+
+        # Versions as tuples of (name, long edge in pixels)
+        self._versions = [(name, config.getInt('Derivatives', name + '_size'))
+                          for name in ('web', 'thumb')]
+
+    @property
+    def versions(self):
+
+        return self._versions
+
+    @staticmethod
+    def getPath(filepath, name):
+
+        root, ext = os.path.splitext(filepath)
+        return '{}_{}{}'.format(root, name, ext)
+
+    def do(self, picture, filepath, name, size):
+        """Store version name of picture and return its path and contents"""
+        image = Image.open(BytesIO(picture.getbuffer()))
+        scale = size / max(image.size)
+        if scale >= 1:
+            logging.info('Skipping %s version of %s as it is not smaller',
+                         name, filepath)
+            return None, None
+        target = (max(round(image.size[0] * scale), 1),
+                  max(round(image.size[1] * scale), 1))
+
+        # Let the decoder scale down by 1/2, 1/4 or 1/8 already
+        image.draft('RGB', target)
+        image = image.resize(target, Image.LANCZOS)
+
+        version = BytesIO()
+        image.save(version, 'JPEG', quality=self._quality, optimize=True)
+
+        path = self.getPath(filepath, name)
+        logging.info('Saving %s version as %s', name, path)
+        self._store.write(path, version.getbuffer())
+        return path, version
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from io import BytesIO
+
+from PIL import Image
+
+
+class Gallery:
+    """
+    SQLite index of all sessions and the files stored for them.
+
+    Sessions are identified by the picture time of the PictureTracker,
+    which is also used in the QR code links. For every file the kind (shot,
+    picture or derivative), size, dimensions and hash are recorded, as well
+    as its delivery status per destination (mail, webdav, ssh, qrcode).
+    All lookups are backed by indexes.
+    """
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS sessions (
+            id INTEGER PRIMARY KEY,
+            picture_time TEXT NOT NULL UNIQUE,
+            started REAL NOT NULL,
+            reviewed REAL,
+            saved REAL
+        );
+        CREATE INDEX IF NOT EXISTS sessions_started ON sessions (started);
+
+        CREATE TABLE IF NOT EXISTS files (
+            id INTEGER PRIMARY KEY,
+            session_id INTEGER NOT NULL REFERENCES sessions (id),
+            kind TEXT NOT NULL,
+            path TEXT NOT NULL UNIQUE,
+            size INTEGER NOT NULL,
+            width INTEGER,
+            height INTEGER,
+            sha1 TEXT NOT NULL,
+            created REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS files_session ON files (session_id, kind);
+
+        CREATE TABLE IF NOT EXISTS deliveries (
+            file_id INTEGER NOT NULL REFERENCES files (id),
+            destination TEXT NOT NULL,
+            status TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            updated REAL NOT NULL,
+            PRIMARY KEY (file_id, destination)
+        );
+        CREATE INDEX IF NOT EXISTS deliveries_status
+            ON deliveries (status, destination);
+    """
+
+    def __init__(self, filename):
+
+        logging.info('Using gallery index "%s"', filename)
+
+        # Shared by the worker threads, access is serialized by the lock
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(filename, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('PRAGMA foreign_keys=ON')
+        with self._db:
+            self._db.executescript(self.schema)
+
+    def close(self):
+
+        with self._lock:
+            self._db.close()
+
+    def _execute(self, sql, parameters=()):
+
+        with self._lock, self._db:
+            return self._db.execute(sql, parameters).fetchall()
+
+    def _session(self, picture_time):
+
+        self._db.execute('INSERT OR IGNORE INTO sessions (picture_time, '
+                         'started) VALUES (?, ?)', (picture_time, time.time()))
+        return self._db.execute('SELECT id FROM sessions WHERE '
+                                'picture_time = ?', (picture_time,)).fetchone()[0]
+
+    def addSession(self, picture_time):
+
+        with self._lock, self._db:
+            self._session(picture_time)
+
+    def setSessionTime(self, picture_time, event):
+        """Record the time of 'reviewed' or 'saved' for a session"""
+        if event not in ('reviewed', 'saved'):
+            raise ValueError('Unknown session event "{}"'.format(event))
+
+        self._execute('UPDATE sessions SET {} = ? WHERE picture_time = ?'.format(
+            event), (time.time(), picture_time))
+
+    def addFile(self, picture_time, kind, path, data):
+        """Record a file with its contents (bytes-like) for a session"""
+        try:
+            width, height = Image.open(BytesIO(data)).size
+        except OSError:
+            width, height = None, None
+        sha1 = hashlib.sha1(data).hexdigest()
+
+        with self._lock, self._db:
+            session_id = self._session(picture_time)
+            self._db.execute('INSERT INTO files (session_id, kind, path, '
+                             'size, width, height, sha1, created) VALUES '
+                             '(?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (path) DO '
+                             'UPDATE SET size = excluded.size, width = '
+                             'excluded.width, height = excluded.height, '
+                             'sha1 = excluded.sha1, created = excluded.created',
+                             (session_id, kind, os.path.abspath(path),
+                              len(data), width, height, sha1, time.time()))
+
+    def setStatus(self, path, destination, status):
+        """Record the delivery status ('sent', 'printed', 'failed') of a file"""
+        self._execute('INSERT INTO deliveries (file_id, destination, status, '
+                      'attempts, updated) SELECT id, ?, ?, 1, ? FROM files '
+                      'WHERE path = ? ON CONFLICT (file_id, destination) DO '
+                      'UPDATE SET status = excluded.status, attempts = '
+                      'attempts + 1, updated = excluded.updated',
+                      (destination, status, time.time(),
+                       os.path.abspath(path)))
+
+    def lastSessions(self, count):
+        """Return the most recent sessions, newest first"""
+        return self._execute('SELECT * FROM sessions ORDER BY started DESC '
+                             'LIMIT ?', (count,))
+
+    def files(self, picture_time, kind=None):
+        """Return the files of a session, optionally only of one kind"""
+        sql = ('SELECT files.* FROM files JOIN sessions ON sessions.id = '
+               'files.session_id WHERE sessions.picture_time = ?')
+        parameters = (picture_time,)
+        if kind is not None:
+            sql += ' AND files.kind = ?'
+            parameters += (kind,)
+        return self._execute(sql, parameters)
+
+    def selectVersion(self, picture_time, size):
+        """Return the smallest version of the assembled picture of a session
+        with a long edge of at least size pixels, or None if there is none"""
+        rows = self._execute('SELECT files.path FROM files JOIN sessions ON '
+                             'sessions.id = files.session_id WHERE '
+                             'sessions.picture_time = ? AND files.kind != '
+                             '\'shot\' AND max(files.width, files.height) >= ? '
+                             'ORDER BY max(files.width, files.height) LIMIT 1',
+                             (picture_time, size))
+        return rows[0]['path'] if len(rows) > 0 else None
+
+    def deliveries(self, path):
+        """Return the delivery status of a file per destination"""
+        return self._execute('SELECT deliveries.* FROM deliveries JOIN files '
+                             'ON files.id = deliveries.file_id WHERE '
+                             'files.path = ?', (os.path.abspath(path),))
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Outbox:
+    """
+    Durable spool of network jobs with retries.
+
+    Every job is a small JSON file in the spool directory that records the
+    destination, the file to send and the number of attempts so far. A
+    drainer thread hands due jobs to the handler registered for their
+    destination and removes them once the handler returned. Failed jobs are
+    retried with exponential backoff. Jobs left over from a previous run
+    are replayed on startup.
+
+    Destinations can be registered to receive jobs in batches, in which
+    case the handler gets a list of files. A batch is sent once it is
+    complete or its oldest job has waited for the given delay. A failed
+    batch backs off as a whole and holds back newer jobs of its
+    destination, so retries are sent in full batches as well.
+    """
+
+    def __init__(self, config, locate=None, report=None):
+
+        self._directory = config.get('Outbox', 'directory')
+        self._retry_min = config.getFloat('Outbox', 'retry_min')
+        self._retry_max = config.getFloat('Outbox', 'retry_max')
+        self._concurrency = config.getInt('Outbox', 'concurrency')
+
+        os.makedirs(self._directory, exist_ok=True)
+
+        # Files may be stored elsewhere until they are written to disk
+        self._locate = locate if locate is not None else (lambda path: path)
+        # Called as report(filepath, destination, status) after each attempt
+        self._report = report
+
+        self._handlers = {}
+        self._batches = {}
+        self._jobs = {}
+        self._running = set()
+        self._active = 0
+        self._condition = threading.Condition()
+        self._is_running = True
+
+        self._pool = ThreadPoolExecutor(max_workers=self._concurrency,
+                                        thread_name_prefix='Outbox')
+        self._drainer = threading.Thread(target=self._drain, daemon=True)
+
+        self.replay()
+
+    def register(self, destination, handler, batch=None):
+        """
+        Send jobs for destination by calling handler(filepath) or, if batch
+        is given as (size, delay in seconds), handler([filepath, ...])
+        """
+        self._handlers[destination] = handler
+        if batch is not None:
+            self._batches[destination] = batch
+
+    def start(self):
+
+        self._drainer.start()
+
+    def shutdown(self):
+        """Stop draining, pending jobs stay in the spool for the next run"""
+        with self._condition:
+            self._is_running = False
+            self._condition.notify()
+
+        if self._drainer.is_alive():
+            self._drainer.join()
+        self._pool.shutdown()
+
+    def put(self, destination, filepath):
+
+        job = {'id': '{}-{}'.format(time.strftime('%Y%m%d%H%M%S'),
+                                    uuid.uuid4().hex[:8]),
+               'destination': destination,
+               'file': os.path.abspath(filepath),
+               'attempts': 0,
+               'created': time.time(),
+               'due': time.time()}
+        self._store(job)
+
+        with self._condition:
+            self._jobs[job['id']] = job
+            self._condition.notify()
+
+    def replay(self):
+
+        for filename in sorted(os.listdir(self._directory)):
+            if not filename.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self._directory, filename), 'r') as f:
+                    job = json.load(f)
+            except (OSError, ValueError) as e:
+                logging.error('Outbox: Skipping job %s: %s', filename, e)
+                continue
+
+            job['due'] = time.time()
+            job.setdefault('created', job['due'])
+            self._jobs[job['id']] = job
+
+        if len(self._jobs) > 0:
+            logging.info('Outbox: Replaying %d pending jobs', len(self._jobs))
+
+    def _path(self, job):
+
+        return os.path.join(self._directory, job['id'] + '.json')
+
+    def _store(self, job):
+
+        # Write atomically, so a crash never leaves a truncated job behind
+        path = self._path(job)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(job, f)
+        os.replace(path + '.tmp', path)
+
+    def _schedule(self, now):
+
+        # Split the due jobs into batches and determine the time at which
+        # the next one becomes due. Jobs of disabled destinations stay in
+        # the spool until they are enabled again.
+        pending = {}
+        sending = set()
+        for job in self._jobs.values():
+            if job['id'] in self._running:
+                sending.add(job['destination'])
+            elif job['destination'] in self._handlers:
+                pending.setdefault(job['destination'], []).append(job)
+
+        batches = []
+        wakeup = None
+        for destination, jobs in pending.items():
+            size, delay = self._batches.get(destination, (1, 0))
+            if destination in self._batches:
+                # Digests are retried as a whole: while a batch is being sent
+                # or backs off after failing, newer jobs wait for it instead
+                # of going out alone
+                if destination in sending:
+                    continue
+                retry = max((job['due'] for job in jobs
+                             if job['attempts'] > 0), default=now)
+                if retry > now:
+                    if wakeup is None or retry < wakeup:
+                        wakeup = retry
+                    continue
+                due = sorted(jobs, key=lambda job: job['created'])
+                times = []
+            else:
+                due = sorted((job for job in jobs if job['due'] <= now),
+                             key=lambda job: job['created'])
+                times = [job['due'] for job in jobs if job['due'] > now]
+
+            while len(due) >= size:
+                batches.append(due[:size])
+                due = due[size:]
+            if len(due) > 0:
+                if due[0]['created'] + delay <= now:
+                    batches.append(due)
+                else:
+                    times.append(due[0]['created'] + delay)
+
+            if len(times) > 0 and (wakeup is None or min(times) < wakeup):
+                wakeup = min(times)
+
+        batches.sort(key=lambda batch: batch[0]['due'])
+        return batches, wakeup
+
+    def _drain(self):
+
+        with self._condition:
+            while self._is_running:
+                now = time.time()
+                batches, wakeup = self._schedule(now)
+
+                free = self._concurrency - self._active
+                for batch in batches[:free]:
+                    self._running.update(job['id'] for job in batch)
+                    self._active += 1
+                    self._pool.submit(self._send, batch)
+
+                if len(batches) > free:
+                    # Woken up when a running batch finishes
+                    timeout = None
+                elif wakeup is not None:
+                    timeout = max(wakeup - now, 0)
+                else:
+                    timeout = None
+                self._condition.wait(timeout)
+
+    def _send(self, batch):
+
+        destination = batch[0]['destination']
+
+        jobs = []
+        files = []
+        for job in batch:
+            filepath = self._locate(job['file'])
+            if os.path.isfile(filepath):
+                jobs.append(job)
+                files.append(filepath)
+                continue
+            logging.error('Outbox: Dropping job %s as %s no longer exists',
+                          job['id'], job['file'])
+            self._remove(job)
+
+        try:
+            if len(jobs) == 0:
+                pass
+            elif destination in self._batches:
+                self._handlers[destination](files)
+            else:
+                self._handlers[destination](files[0])
+        except Exception as e:
+            # The jobs are retried together, so digests stay in one piece
+            attempts = max(job['attempts'] for job in jobs) + 1
+            delay = min(self._retry_min * 2 ** (attempts - 1),
+                        self._retry_max)
+            due = time.time() + delay
+            for job in jobs:
+                job['attempts'] += 1
+                job['due'] = due
+                try:
+                    self._store(job)
+                except OSError as err:
+                    logging.error('Outbox: Could not update job %s: %s',
+                                  job['id'], err)
+            logging.warn('Outbox: Sending %s to %s failed (attempt %d), '
+                         'retrying in %.0f s: %s', ', '.join(files),
+                         destination, attempts, delay, e)
+            succeeded = False
+        else:
+            if len(jobs) > 0:
+                logging.info('Outbox: Sent %s to %s', ', '.join(files),
+                             destination)
+            for job in jobs:
+                self._remove(job)
+            succeeded = len(jobs) > 0
+
+        if self._report is not None:
+            try:
+                for job in jobs:
+                    self._report(job['file'], destination,
+                                 'sent' if succeeded else 'failed')
+            except Exception as e:
+                logging.error('Outbox: Could not report status: %s', e)
+
+        with self._condition:
+            self._active -= 1
+            for job in batch:
+                self._running.discard(job['id'])
+                if succeeded or job not in jobs:
+                    del self._jobs[job['id']]
+            if succeeded:
+                # The destination is reachable again, flush its backlog
+                # right away instead of waiting for the backoff to expire
+                now = time.time()
+                for other in self._jobs.values():
+                    if other['destination'] == destination:
+                        other['due'] = min(other['due'], now)
+            self._condition.notify()
+
+    def _remove(self, job):
+
+        try:
+            os.remove(self._path(job))
+        except OSError as e:
+            logging.error('Outbox: Could not remove job %s: %s', job['id'], e)
@@ -1,62 +1,105 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import base64
 import logging
 import smtplib
+import threading
 
+from email import policy
 from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
 from email.mime.text import MIMEText
 from email.utils import formatdate
-from email import encoders
 
 from pathlib import Path
 
 from .WorkerTask import WorkerTask
 
 
-def send_mail(send_from, send_to, subject, message, picture, filename,
-              server, port, is_auth, username, password, is_tls):
-    """Compose and send email with provided info and attachments.
+def stream_mail(send_from, send_to, subject, message, pictures,
+                chunk_size=57 * 1024):
+    """Compose an email with attachments and yield it in chunks.
 
-    Based on https://stackoverflow.com/a/16509278
+    The attachments are read and base64-encoded block by block, so the
+    whole message is never held in memory. Chunks are ready to be sent as
+    SMTP DATA, i.e., with CRLF line endings and dot-stuffing applied.
 
     Args:
         send_from (str): from name
         send_to (str): to name
         subject (str): message title
         message (str): message body
-        picture (jpg byte_data): ByteIO data of the JPG picture
-        filename (str): Filename of picture
-        server (str): mail server host name
-        port (int): port number
-        is_auth (bool): server requires authentication
-        username (str): server auth username
-        password (str): server auth password
-        is_tls (bool): use TLS mode
+        pictures (list): Paths of the JPG pictures
+        chunk_size (int): Bytes of attachment data per chunk, must be a
+            multiple of 57 to yield complete base64 lines
     """
-    msg = MIMEMultipart()
+    msg = MIMEMultipart(policy=policy.SMTP)
     msg['From'] = send_from
     msg['To'] = send_to
     msg['Date'] = formatdate(localtime=True)
     msg['Subject'] = subject
 
-    msg.attach(MIMEText(message))
+    msg.attach(MIMEText(message, policy=policy.SMTP))
 
-    part = MIMEBase('application', "octet-stream")
-    part.set_payload(picture.getbuffer())
-    encoders.encode_base64(part)
-    part.add_header('Content-Disposition',
-                    'attachment; filename="{}"'.format(filename))
-    msg.attach(part)
+    # Attachments get a placeholder, which is replaced by the encoded file
+    # contents while streaming
+    placeholders = []
+    for i, picture in enumerate(pictures):
+        placeholder = 'attachment-{}-{}'.format(i, id(msg))
+        placeholders.append(placeholder.encode('ascii'))
 
-    smtp = smtplib.SMTP(server, port)
-    if is_tls:
-        smtp.starttls()
-    if is_auth:
-        smtp.login(username, password)
-    smtp.sendmail(send_from, send_to, msg.as_string())
-    smtp.quit()
+        part = MIMEBase('application', "octet-stream", policy=policy.SMTP)
+        part['Content-Transfer-Encoding'] = 'base64'
+        part.add_header('Content-Disposition',
+                        'attachment; filename="{}"'.format(Path(picture).name))
+        part.set_payload(placeholder)
+        msg.attach(part)
+
+    data = msg.as_bytes()
+    for picture, placeholder in zip(pictures, placeholders):
+        head, data = data.split(placeholder, 1)
+        yield smtplib.quotedata(head.decode('ascii')).encode('ascii')
+
+        with open(picture, 'rb') as f:
+            for block in iter(lambda: f.read(chunk_size), b''):
+                # Base64 lines never start with a dot
+                yield base64.encodebytes(block).replace(b'\n', b'\r\n')
+
+    yield smtplib.quotedata(data.decode('ascii')).encode('ascii')
+
+
+def send_mail(smtp, send_from, send_to, chunks):
+    """Send a streamed email over an established SMTP connection.
+
+    Args:
+        smtp (smtplib.SMTP): connection to the mail server
+        send_from (str): sender address
+        send_to (str): recipient address
+        chunks (iterable): message as yielded by stream_mail
+    """
+    smtp.ehlo_or_helo_if_needed()
+    code, resp = smtp.mail(send_from)
+    if code != 250:
+        raise smtplib.SMTPSenderRefused(code, resp, send_from)
+    code, resp = smtp.rcpt(send_to)
+    if code not in (250, 251):
+        raise smtplib.SMTPRecipientsRefused({send_to: (code, resp)})
+
+    smtp.putcmd('data')
+    code, resp = smtp.getreply()
+    if code != 354:
+        raise smtplib.SMTPDataError(code, resp)
+
+    tail = b''
+    for chunk in chunks:
+        smtp.send(chunk)
+        tail = (tail + chunk)[-2:]
+    smtp.send(b'.\r\n' if tail == b'\r\n' else b'\r\n.\r\n')
+
+    code, resp = smtp.getreply()
+    if code != 250:
+        raise smtplib.SMTPDataError(code, resp)
 
 
 class PictureMailer(WorkerTask):
@@ -77,9 +120,70 @@ class PictureMailer(WorkerTask):
         self._password = config.get('Mailer', 'password')
         self._is_tls = config.getBool('Mailer', 'use_tls')
 
-    def do(self, picture, filename):
-
-        logging.info('Sending picture to %s', self._recipient)
-        send_mail(self._sender, self._recipient, self._subject, self._message,
-                  picture, Path(filename).name, self._server, self._port,
-                  self._is_auth, self._user, self._password, self._is_tls)
+        # Pictures per mail and maximum delay in seconds before sending
+        self._digest = (max(config.getInt('Mailer', 'digest_count'), 1),
+                        config.getInt('Mailer', 'digest_time') * 60)
+
+        # The connection is kept open across mails and is re-established
+        # once the server dropped it
+        self._smtp = None
+        self._lock = threading.Lock()
+
+    @property
+    def digest(self):
+
+        return self._digest
+
+    def _connect(self):
+
+        logging.info('Connecting to SMTP server %s:%d', self._server,
+                     self._port)
+        smtp = smtplib.SMTP(self._server, self._port, timeout=60)
+        if self._is_tls:
+            smtp.starttls()
+        if self._is_auth:
+            smtp.login(self._user, self._password)
+        return smtp
+
+    def _close(self):
+
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except OSError:
+                pass
+            self._smtp = None
+
+    def do(self, filenames):
+
+        logging.info('Sending %d pictures to %s', len(filenames),
+                     self._recipient)
+
+        with self._lock:
+            # Idle connections get closed by the server eventually, which is
+            # only detected when they are used again
+            is_fresh = self._smtp is None
+            while True:
+                if self._smtp is None:
+                    self._smtp = self._connect()
+
+                chunks = stream_mail(self._sender, self._recipient,
+                                     self._subject, self._message, filenames)
+                try:
+                    send_mail(self._smtp, self._sender, self._recipient,
+                              chunks)
+                    return
+                except (smtplib.SMTPServerDisconnected, ConnectionError):
+                    self._smtp = None
+                    if is_fresh:
+                        raise
+                    is_fresh = True
+                except Exception:
+                    # The session is in an unknown state
+                    self._close()
+                    raise
+
+    def close(self):
+
+        with self._lock:
+            self._close()
@@ -2,35 +2,138 @@
 # -*- coding: utf-8 -*-
 
 import logging
+import socket
+import threading
 
-from paramiko import SSHClient
-from scp import SCPClient
+from paramiko import SSHClient, SSHException
 
 from pathlib import Path, PurePosixPath
 
 from .WorkerTask import WorkerTask
 
 
-def send_file(server_host, server_port, dest_folder, ssh_user, ssh_password, picture_path):
+class SFTPPool:
     """
-    Send a file using SCP.
+    Long-lived SSH connection with a pool of SFTP sessions.
+
+    All uploads share a single SSH transport, so the handshake and
+    authentication are done once instead of for every file. Concurrent
+    uploads get a session (channel) each. If the connection dropped, it is
+    re-established on the next upload.
 
     Args:
       server_host (str): SSH server
-      server_port (str): SSH server port
-      dest_folder (str): Destination folder
+      server_port (int): SSH server port
       ssh_user (str): SSH username
       ssh_password (str): SSH password (optional)
+      timeout (float): Timeout for connecting and blocking I/O in seconds
     """
-    with SSHClient() as ssh:
-        ssh.load_system_host_keys()
+
+    def __init__(self, server_host, server_port, ssh_user, ssh_password,
+                 timeout=30):
+
+        self._host = server_host
+        self._port = server_port
+        self._user = ssh_user
+        self._password = ssh_password if ssh_password else None
+        self._timeout = timeout
+
+        self._lock = threading.Lock()
+        self._client = None
+        self._idle = []
+
+    def _connect(self):
+
+        logging.info('Connecting to SSH server %s:%d', self._host, self._port)
+        client = SSHClient()
+        client.load_system_host_keys()
+        client.connect(self._host, self._port, self._user, self._password,
+                       timeout=self._timeout)
+        client.get_transport().set_keepalive(30)
+        return client
+
+    def _acquire(self):
+
+        with self._lock:
+            if (self._client is None or
+                    not self._client.get_transport().is_active()):
+                self._close()
+                self._client = self._connect()
+            client = self._client
+            sftp = self._idle.pop() if self._idle else None
+
+        if sftp is None:
+            sftp = client.open_sftp()
+            sftp.get_channel().settimeout(self._timeout)
+        return client, sftp
+
+    def _release(self, client, sftp):
+
+        with self._lock:
+            if client is self._client:
+                self._idle.append(sftp)
+                return
+        sftp.close()
+
+    def _discard(self, sftp):
+
         try:
-            ssh.connect(server_host, server_port, ssh_user, ssh_password)
+            sftp.close()
+        except Exception:
+            pass
+
+    def _close(self):
+
+        for sftp in self._idle:
+            sftp.close()
+        self._idle = []
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+    def close(self):
+
+        with self._lock:
+            self._close()
+
+    def reset(self, client):
+        """Drop the given connection, if it is still the current one"""
+        with self._lock:
+            if client is self._client:
+                self._close()
+
+    def put(self, localpath, remotepath):
+
+        with open(localpath, 'rb') as f:
+            # A connection that went stale while idle is only detected when
+            # it is used, hence one retry on a fresh connection
+            for attempt in range(2):
+                client, sftp = None, None
+                try:
+                    client, sftp = self._acquire()
+                    # putfo pipelines the writes, i.e., it does not wait for
+                    # the server to acknowledge each block
+                    f.seek(0)
+                    sftp.putfo(f, remotepath)
+                except (SSHException, EOFError, socket.timeout,
+                        ConnectionError) as e:
+                    if sftp is not None:
+                        self._discard(sftp)
+                    if client is not None:
+                        self.reset(client)
+                    if attempt > 0:
+                        raise
+                    logging.warn('SSH connection failed, reconnecting: %s', e)
+                except OSError:
+                    # Failed on the server, e.g. missing folder or permission
+                    # denied, other uploads on the connection are unaffected
+                    if sftp is not None:
+                        self._discard(sftp)
+                    raise
+                else:
+                    self._release(client, sftp)
+                    return
 
-            with SCPClient(ssh.get_transport()) as scp:
-                scp.put(picture_path, remote_path=PurePosixPath(dest_folder,Path(picture_path).name))
-        except Exception as err:
-            logging.error("Unable to send picture " + str(picture_path) + " using SSH : ", err)
 
 class PictureSSH(WorkerTask):
 
@@ -39,14 +142,19 @@ class PictureSSH(WorkerTask):
         super().__init__()
 
         self._server_host = config.get('SSH', 'ssh_server_host')
-        self._server_port = config.get('SSH', 'ssh_server_port')
         self._dest_folder = config.get('SSH', 'ssh_server_folder')
-        self._ssh_user = config.get('SSH', 'ssh_server_user')
-        self._ssh_password = config.get('SSH', 'ssh_server_password')
 
-    def do(self, pictures_list):
+        self._pool = SFTPPool(self._server_host,
+                              config.getInt('SSH', 'ssh_server_port'),
+                              config.get('SSH', 'ssh_server_user'),
+                              config.get('SSH', 'ssh_server_password'))
+
+    def do(self, picture_path):
+
+        remote_path = PurePosixPath(self._dest_folder, Path(picture_path).name)
+        logging.debug('Sending picture %s to %s', remote_path, self._server_host)
+        self._pool.put(picture_path, str(remote_path))
 
-        for picture_path in pictures_list:
-            logging.debug('Sending picture %s to %s', PurePosixPath(self._dest_folder,Path(picture_path).name), self._server_host)
-            send_file(self._server_host, self._server_port, self._dest_folder, self._ssh_user, self._ssh_password, picture_path)
+    def close(self):
 
+        self._pool.close()
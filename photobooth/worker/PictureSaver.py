@@ -8,10 +8,12 @@ from .WorkerTask import WorkerTask
 
 class PictureSaver(WorkerTask):
 
-    def __init__(self, basedir):
+    def __init__(self, basedir, store):
 
         super().__init__()
 
+        self._store = store
+
         # Ensure directory exists
         if not os.path.exists(basedir):
             os.makedirs(basedir)
@@ -19,5 +21,4 @@ class PictureSaver(WorkerTask):
     def do(self, picture, filepath):
 
         logging.info('Saving picture as %s', filepath)
-        with open(filepath, 'wb') as f:
-            f.write(picture.getbuffer())
+        self._store.write(filepath, picture.getbuffer())
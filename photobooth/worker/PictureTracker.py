@@ -1,24 +1,29 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+from concurrent.futures import Future
 from datetime import datetime
 from time import localtime, strftime
 import os
+import threading
 
 class PictureTracker:
     """
     A simple helper class.
 
     It provides the filenames for the shots and assembled pictures
-    Also keeps count of taken and previously existing pictures.
+    Also keeps count of taken and previously existing pictures and tracks
+    when all files of a picture have been saved.
     """
 
-    def __init__(self):
+    def __init__(self, num_shots):
         """
         Initialize filenames to the given basename and search for existing files. Set the counter accordingly.
+        num_shots is the number of single shots that are saved per picture.
         """
         self.extension = '.jpg'
-        self.shots_count = 4
+        self._num_shots = num_shots
+        self._lock = threading.Lock()
 
         # Initialize tracker
         self.initializeNextPicture()
@@ -38,6 +43,10 @@ class PictureTracker:
         self._shots = []
         self._counter = 0
 
+        # Completed once the shots and the assembled picture are saved
+        self._saved = Future()
+        self._pending = [self._num_shots + 1]
+
     def _initializeFolder(self):
         if not os.path.isdir(self._basedir):
             os.mkdir(self._basedir)
@@ -57,6 +66,16 @@ class PictureTracker:
         """Return the list of current shots"""
         return self._shots
 
+    @property
+    def expected_shots(self):
+        """Return the list of shots that are going to be saved"""
+        return [self.getShotPath(i) for i in range(1, self._num_shots + 1)]
+
+    @property
+    def saved(self):
+        """Return a future that completes once all files are saved"""
+        return self._saved
+
     @property
     def picture_time(self):
         """Return the time of the picture"""
@@ -89,16 +108,17 @@ class PictureTracker:
         self._shots.append(shot_path)
         return shot_path
 
-    def checkAllFilesExists(self):
+    def addFile(self, future):
         """
-        Check if all files (shots and assembled picture) exists on local filesystem
+        Register the future of a file being saved for the current picture
         """
-        # Check for all shots
-        for i in range(1, self.shots_count+1):
-            shot_path = self.getShotPath(i)
-            if not os.path.isfile(shot_path):
-                return False
-        # Check for the assembled picture
-        if not os.path.isfile(self.getPicturePath()):
-            return False
-        return True
+        saved, pending = self._saved, self._pending
+
+        def fileSaved(future):
+            with self._lock:
+                pending[0] -= 1
+                is_complete = pending[0] == 0
+            if is_complete:
+                saved.set_result(None)
+
+        future.add_done_callback(fileSaved)
@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 
 import logging
+import threading
 import requests
 
 from pathlib import Path
@@ -15,19 +16,62 @@ class PictureUploadWebdav(WorkerTask):
 
         super().__init__()
 
-        self._baseurl = config.get('UploadWebdav', 'url')
+        self._baseurl = config.get('UploadWebdav', 'url').rstrip('/')
+        self._use_date_folder = config.getBool('UploadWebdav',
+                                               'use_date_folder')
+
+        # Connections are kept alive and shared by concurrent uploads
+        self._session = requests.Session()
+        concurrency = config.getInt('Outbox', 'concurrency')
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1,
+                                                pool_maxsize=concurrency)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
         if config.getBool('UploadWebdav', 'use_auth'):
-            self._auth = (config.get('UploadWebdav', 'user'),
-                          config.get('UploadWebdav', 'password'))
-        else:
-            self._auth = None
+            self._session.auth = (config.get('UploadWebdav', 'user'),
+                                  config.get('UploadWebdav', 'password'))
+
+        # Collections known to exist on the server
+        self._collections = set()
+        self._lock = threading.Lock()
+
+    def _makeCollection(self, url):
+
+        with self._lock:
+            if url in self._collections:
+                return
 
-    def do(self, picture, filename):
+            logging.info('Creating collection %s', url)
+            r = self._session.request('MKCOL', url, timeout=(10, 60))
+            # 405 Method Not Allowed means the collection exists already
+            if r.status_code not in range(200, 300) and r.status_code != 405:
+                raise RuntimeError(('PictureUploadWebdav: MKCOL {} failed '
+                                    'with status code {}').format(
+                                        url, r.status_code))
+            self._collections.add(url)
+
+    def do(self, filename):
+
+        collection = self._baseurl
+        if self._use_date_folder:
+            # Pictures are stored in date folders locally, mirror them
+            collection += '/' + Path(filename).parent.name
+            self._makeCollection(collection)
+        url = collection + '/' + Path(filename).name
 
-        url = self._baseurl + '/' + Path(filename).name
         logging.info('Uploading picture as %s', url)
+        with open(filename, 'rb') as f:
+            # The body is streamed from the file
+            r = self._session.put(url, data=f, timeout=(10, 60))
+
+        if r.status_code == 409:
+            # The collection has been removed in the meantime
+            with self._lock:
+                self._collections.discard(collection)
+        if r.status_code not in range(200, 300):
+            raise RuntimeError(('PictureUploadWebdav: Upload failed with '
+                                'status code {}').format(r.status_code))
+
+    def close(self):
 
-        r = requests.put(url, data=picture.getbuffer(), auth=self._auth)
-        if r.status_code in range(200, 300):
-            logging.warn(('PictureUploadWebdav: Upload failed with '
-                          'status code {}').format(r.status_code))
+        self._session.close()
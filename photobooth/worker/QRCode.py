@@ -1,24 +1,23 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import logging
-import os
+import threading
 import cups
 import qrcode
+from collections import OrderedDict
+from io import BytesIO
 from urllib.parse import urlparse, urlunparse
-import os
 import posixpath
 import barcode
 from barcode.writer import ImageWriter
 
-from PIL import Image, ImageQt
+from PIL import Image
+
+from ..printer.PrintSpooler import PrintSpooler
 
 class QRCode:
 
     def __init__(self, cfg):
-        # Open CUPS connection
-        self._cups = cups.Connection()
-
         # Read config
         self._base_url = cfg.get('QRCode', 'url_prefix')
         self._printer_name = cfg.get('QRCode', 'printer_name')
@@ -27,14 +26,10 @@ class QRCode:
         self._header_height = cfg.getInt('QRCode', 'qrcode_header_height')
         self._barcode_enable = cfg.getBool('QRCode', 'barcode_enable')
 
-        # Prepare temporary variables
-        if os.access('/dev/shm', os.W_OK):
-            self._tmp_result_file = '/dev/shm/print.jpg'
-            self._tmp_barcode_file = '/dev/shm/barcode.jpg'
-        else:
-            self._tmp_result_file = '/tmp/print.jpg'
-            self._tmp_barcode_file = '/tmp/barcode.jpg'
-        self._qrcode_img = None
+        # Prints rendered ahead of time, by picture time. Only the most
+        # recent ones are kept, in case a session is aborted.
+        self._prepared = OrderedDict()
+        self._lock = threading.Lock()
 
         # Load header image
         if self._header_file is None or self._header_file == "":
@@ -44,30 +39,52 @@ class QRCode:
             self._header_img = self._header_img.resize((self._header_width, self._header_height))
 
         # Check for printer
-        if self._printer_name not in self._cups.getPrinters().keys():
+        if self._printer_name not in cups.Connection().getPrinters().keys():
             raise Exception('Unable to get the printer ' + self._printer_name)
 
-    def do(self, picture, picture_tracker):
+        # Jobs are sent in the background, each with its own buffer
+        self._spooler = PrintSpooler(self._printer_name)
+
+    def prepare(self, picture_time):
+        """Render the print for picture_time, as soon as it is known"""
+        data = self._render(picture_time)
+        with self._lock:
+            self._prepared[picture_time] = data
+            while len(self._prepared) > 4:
+                self._prepared.popitem(last=False)
+
+    def do(self, picture_time):
+        """Queue the print and return a Future that completes once printed"""
+        with self._lock:
+            data = self._prepared.pop(picture_time, None)
+        if data is None:
+            data = self._render(picture_time)
+
+        return self.print(data)
+
+    def print(self, data):
+        return self._spooler.submit(data.getbuffer(), "photobooth")
+
+    def close(self):
+        self._spooler.close()
+
+    def _render(self, picture_time):
         # Generate the URL
         parsed_base_url = urlparse(self._base_url)
-        generated_url = urlunparse(parsed_base_url._replace(path=posixpath.join(parsed_base_url.path,picture_tracker.picture_time)))
+        generated_url = urlunparse(parsed_base_url._replace(path=posixpath.join(parsed_base_url.path,picture_time)))
 
         # Generate QRCode and Barcode
-        self._generate_qrcode(generated_url)
+        imgs = []
+        if self._header_img is not None:
+            imgs.append(self._header_img)
+        imgs.append(self._generate_qrcode(generated_url))
         if self._barcode_enable:
-            self._generate_barcode(picture_tracker.picture_time)
-
-        # Generate result file
-        self._generate_full_image()
-
-        # Print
-        try:
-            self.print(self._tmp_result_file)
-        except Exception as err:
-            logging.error("Unable to print QRCode", err)
+            imgs.append(self._generate_barcode(picture_time))
 
-    def print(self, filepath):
-        self._cups.printFile(self._printer_name, filepath, "photobooth", {})
+        # Generate result image
+        data = BytesIO()
+        self._generate_full_image(imgs).save(data, format='jpeg')
+        return data
 
     def _generate_qrcode(self, text):
         qr = qrcode.QRCode(
@@ -78,7 +95,7 @@ class QRCode:
         )
         qr.add_data(text)
         qr.make(fit=True)
-        self._qrcode_img = qr.make_image(fill_color="black", back_color="white").get_image()
+        return qr.make_image(fill_color="black", back_color="white").get_image().convert('RGB')
 
     def _generate_barcode(self, text):
         EAN = barcode.get_barcode_class('ean13')
@@ -87,18 +104,9 @@ class QRCode:
         # dirty disabling of text
         writer._callbacks['paint_text'] = None
         ean = EAN(text, writer=writer)
-        f = open(self._tmp_barcode_file, 'wb')
-        ean.write(f, {"paint_text": None})
-
-    def _generate_full_image(self):
-        # Generate images list
-        imgs = []
-        if self._header_file is not None:
-             imgs.append(self._header_img)
-        imgs.append(self._qrcode_img)
-        if self._barcode_enable:
-            imgs.append(Image.open(self._tmp_barcode_file).convert('RGB'))
+        return ean.render({"paint_text": None}).convert('RGB')
 
+    def _generate_full_image(self, imgs):
         widths, heights = zip(*(i.size for i in imgs))
         total_width = max(widths)
         max_height = sum(heights)
@@ -107,4 +115,4 @@ class QRCode:
         for im in imgs:
             concatenateImage.paste(im, (int((total_width - im.size[0]) / 2), y_offset))
             y_offset += im.size[1]
-        concatenateImage.save(self._tmp_result_file)
+        return concatenateImage
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import threading
+import time
+
+from concurrent.futures import (Future, InvalidStateError,
+                                ThreadPoolExecutor, TimeoutError)
+
+
+class TaskExecutor:
+    """
+    Runs worker tasks on a bounded thread pool.
+
+    A task is started once all the tasks it depends on have completed
+    successfully, otherwise it fails without being run. Tasks it is only
+    ordered after have to complete, whether they succeed or not. A task that
+    does not complete within the timeout is reported as failed, so that
+    neither its dependents nor the caller wait for it any longer. The thread
+    itself cannot be interrupted and finishes in the background.
+
+    On shutdown, tasks waiting for dependencies are still run as long as
+    the tasks they wait for are. Tasks that wait for anything else are
+    failed, so that no future is left unsettled.
+    """
+
+    def __init__(self, max_workers, timeout):
+
+        self._pool = ThreadPoolExecutor(max_workers=max_workers,
+                                        thread_name_prefix='TaskExecutor')
+        self._timeout = timeout
+
+        # Tasks waiting for dependencies and tasks scheduled on the pool
+        # whose future has not yet been settled, including its callbacks
+        self._condition = threading.Condition()
+        self._waiting = {}
+        self._active = 0
+        self._is_closed = False
+
+    def submit(self, name, fn, *args, depends=(), after=()):
+        """Schedule fn(*args) after the given futures and return a Future"""
+        future = Future()
+        pending = [len(depends) + len(after)]
+
+        def dependencyDone(dependency):
+
+            with self._condition:
+                pending[0] -= 1
+                if pending[0] > 0:
+                    return
+                if self._waiting.pop(future, None) is None:
+                    # Already failed by shutdown
+                    return
+                is_failed = any(d.cancelled() or d.exception() is not None
+                                for d in depends)
+                if not is_failed:
+                    self._schedule(future, name, fn, args)
+                self._condition.notify_all()
+
+            if is_failed:
+                logging.warn('Skipping task %s as a dependency failed', name)
+                self._settle(future, exception=RuntimeError(
+                    'Dependency of {} failed'.format(name)))
+
+        with self._condition:
+            if self._is_closed:
+                raise RuntimeError('TaskExecutor is shut down')
+            if pending[0] == 0:
+                self._schedule(future, name, fn, args)
+            else:
+                self._waiting[future] = name
+        for dependency in tuple(depends) + tuple(after):
+            dependency.add_done_callback(dependencyDone)
+
+        return future
+
+    def shutdown(self, wait=True):
+
+        with self._condition:
+            # Dependencies of waiting tasks may still be running
+            while wait and len(self._waiting) > 0 and self._active > 0:
+                self._condition.wait()
+            self._is_closed = True
+            abandoned, self._waiting = self._waiting, {}
+
+        for future, name in abandoned.items():
+            logging.error('Task %s not run due to shutdown', name)
+            self._settle(future, exception=RuntimeError(
+                '{} not run due to shutdown'.format(name)))
+
+        self._pool.shutdown(wait=wait)
+
+    def _schedule(self, future, name, fn, args):
+
+        # Called with the condition held
+        self._active += 1
+        self._pool.submit(self._run, future, name, fn, args)
+
+    def _release(self):
+
+        # Called once the future of a scheduled task has been settled and
+        # its callbacks have run, so that tasks they unblock are already
+        # scheduled when shutdown() sees no active task
+        with self._condition:
+            self._active -= 1
+            self._condition.notify_all()
+
+    def _settle(self, future, result=None, exception=None):
+
+        # The worker thread and the watchdog race to settle the future
+        try:
+            if exception is None:
+                future.set_result(result)
+            else:
+                future.set_exception(exception)
+        except InvalidStateError:
+            return False
+        return True
+
+    def _expire(self, future, name):
+
+        if self._settle(future, exception=TimeoutError(
+                '{} timed out'.format(name))):
+            logging.error('Task %s timed out after %d s', name, self._timeout)
+            self._release()
+
+    def _run(self, future, name, fn, args):
+
+        if not future.set_running_or_notify_cancel():
+            self._release()
+            return
+
+        watchdog = threading.Timer(self._timeout, self._expire, (future, name))
+        watchdog.daemon = True
+        watchdog.start()
+
+        start = time.monotonic()
+        try:
+            result = fn(*args)
+        except Exception as e:
+            logging.error('Task %s failed: %s', name, e)
+            is_settled = self._settle(future, exception=e)
+        else:
+            logging.debug('Task %s took %.0f ms', name,
+                          (time.monotonic() - start) * 1000)
+            is_settled = self._settle(future, result)
+        finally:
+            watchdog.cancel()
+
+        if is_settled:
+            self._release()
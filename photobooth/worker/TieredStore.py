@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import os
+import shutil
+import threading
+
+
+class TieredStore:
+    """
+    Two-tier file store with write-behind to persistent storage.
+
+    Files are written to a tmpfs directory first, which is fast and
+    predictable, and copied to their actual location by a background
+    flusher. The flusher handles files in batches: it writes them to
+    temporary names, syncs them all, renames them into place and syncs the
+    affected directories once. Until a file is flushed, locate() returns
+    its path in tmpfs.
+
+    The tmpfs directory mirrors the absolute target paths, so files left
+    behind by a crash are flushed on the next startup. If storing a file
+    would exceed the tmpfs size limit, it is written directly instead.
+    Rewrites of a file that is not yet flushed always replace it in tmpfs,
+    so an older version can never overwrite a newer one on disk.
+    """
+
+    def __init__(self, config):
+
+        self._tmpfs_dir = config.get('Storage', 'tmpfs_dir')
+        self._max_size = config.getInt('Storage', 'tmpfs_size') * 2**20
+        self._interval = config.getFloat('Storage', 'flush_interval')
+
+        self._is_enabled = config.getBool('Storage', 'write_behind')
+        if self._is_enabled:
+            try:
+                os.makedirs(self._tmpfs_dir, exist_ok=True)
+            except OSError as e:
+                logging.warn('Cannot use %s for write-behind: %s',
+                             self._tmpfs_dir, e)
+                self._is_enabled = False
+
+        # Pending files as tuples of (tmpfs path, size, generation), the
+        # generation tells rewrites apart from the version being flushed
+        self._pending = {}
+        self._size = 0
+        self._generation = 0
+        self._condition = threading.Condition()
+        self._is_running = True
+
+        if self._is_enabled:
+            self.recover()
+            self._flusher = threading.Thread(target=self._flush, daemon=True)
+            self._flusher.start()
+
+    def _tmpfsPath(self, path):
+
+        return os.path.join(self._tmpfs_dir, path.lstrip(os.sep))
+
+    def recover(self):
+
+        for dirpath, _, filenames in os.walk(self._tmpfs_dir):
+            for filename in filenames:
+                tmp_path = os.path.join(dirpath, filename)
+                if filename.endswith('.part'):
+                    os.remove(tmp_path)
+                    continue
+                path = os.path.join(os.sep, os.path.relpath(tmp_path,
+                                                            self._tmpfs_dir))
+                size = os.path.getsize(tmp_path)
+                self._generation += 1
+                self._pending[path] = (tmp_path, size, self._generation)
+                self._size += size
+
+        if len(self._pending) > 0:
+            logging.info('Flushing %d files left over in %s',
+                         len(self._pending), self._tmpfs_dir)
+
+    def write(self, path, data):
+        """Store data (bytes-like) as file path"""
+        path = os.path.abspath(path)
+        size = len(data)
+
+        with self._condition:
+            is_tmpfs = self._is_enabled and (
+                path in self._pending or self._size + size <= self._max_size)
+            if is_tmpfs:
+                self._size += size
+
+        if is_tmpfs:
+            tmp_path = self._tmpfsPath(path)
+            try:
+                os.makedirs(os.path.dirname(tmp_path), exist_ok=True)
+                with open(tmp_path + '.part', 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path + '.part', tmp_path)
+            except OSError as e:
+                logging.warn('Could not write %s to tmpfs: %s', path, e)
+                with self._condition:
+                    self._size -= size
+            else:
+                with self._condition:
+                    # A rewrite frees the space of the replaced version
+                    if path in self._pending:
+                        self._size -= self._pending[path][1]
+                    self._generation += 1
+                    self._pending[path] = (tmp_path, size, self._generation)
+                    self._condition.notify()
+                return
+        elif self._is_enabled:
+            logging.warn('tmpfs limit reached, writing %s directly', path)
+
+        with open(path, 'wb') as f:
+            f.write(data)
+
+    def locate(self, path):
+        """Return the path under which the file can be read right now"""
+        with self._condition:
+            entry = self._pending.get(os.path.abspath(path))
+            return entry[0] if entry is not None else path
+
+    def close(self):
+        """Flush all pending files and stop the flusher"""
+        with self._condition:
+            self._is_running = False
+            self._condition.notify()
+
+        if self._is_enabled:
+            self._flusher.join()
+
+    def _flush(self):
+
+        while True:
+            with self._condition:
+                while self._is_running and len(self._pending) == 0:
+                    self._condition.wait()
+                if self._is_running:
+                    # Collect further files to share the syncs
+                    self._condition.wait(self._interval)
+                batch = dict(self._pending)
+                is_running = self._is_running
+
+            if len(batch) > 0:
+                self._flushBatch(batch)
+            if not is_running:
+                break
+
+    def _sync(self, path):
+
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _flushBatch(self, batch):
+
+        written = {}
+        for path, (tmp_path, _, _) in batch.items():
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(tmp_path, 'rb') as src:
+                    with open(path + '.part', 'wb') as dst:
+                        shutil.copyfileobj(src, dst, 2**20)
+                written[path] = tmp_path
+            except OSError as e:
+                logging.error('Could not write %s: %s', path, e)
+
+        # One sync per file and directory for the whole batch
+        for path in list(written):
+            try:
+                self._sync(path + '.part')
+                os.replace(path + '.part', path)
+            except OSError as e:
+                logging.error('Could not write %s: %s', path, e)
+                del written[path]
+
+        for directory in set(os.path.dirname(path) for path in written):
+            try:
+                self._sync(directory)
+            except OSError as e:
+                logging.error('Could not sync %s: %s', directory, e)
+
+        # Files rewritten in the meantime stay pending with their new version
+        with self._condition:
+            for path, tmp_path in written.items():
+                if self._pending.get(path) != batch[path]:
+                    continue
+                del self._pending[path]
+                self._size -= batch[path][1]
+                try:
+                    os.remove(tmp_path)
+                except OSError as e:
+                    logging.error('Could not remove %s: %s', tmp_path, e)
+
+        logging.debug('Flushed %d files to disk', len(written))
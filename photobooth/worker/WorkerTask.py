@@ -10,3 +10,7 @@ class WorkerTask:
     def do(self, picture):
 
         raise NotImplementedError()
+
+    def close(self):
+
+        pass
@@ -1,64 +1,139 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import logging
+
 from .. import StateMachine
 from ..Threading import Workers
+from ..camera.PictureDimensions import PictureDimensions
 
+from .Derivatives import Derivatives
+from .Gallery import Gallery
 from .PictureTracker import PictureTracker
 from .PictureMailer import PictureMailer
 from .PictureSaver import PictureSaver
 from .PictureUploadWebdav import PictureUploadWebdav
 from .PictureSSH import PictureSSH
 from .QRCode import QRCode
+from .Outbox import Outbox
+from .TaskExecutor import TaskExecutor
+from .TieredStore import TieredStore
 
-import time
 
 class Worker:
 
+    # States handled by this worker
+    topics = (StateMachine.GreeterState, StateMachine.ReviewState,
+              StateMachine.TeardownState)
+
     def __init__(self, config, comm):
 
         self._comm = comm
 
-        # Track the picture
-        self._pic_tracker = PictureTracker()
+        # Track the picture and the files saved for it
+        if config.getBool('Picture', 'keep_pictures'):
+            num_shots = PictureDimensions(config, None).totalNumPictures
+        else:
+            num_shots = 0
+        self._pic_tracker = PictureTracker(num_shots)
+
+        # Postprocess tasks run in the background, so the next guest does
+        # not have to wait for network uploads
+        self._executor = TaskExecutor(
+            config.getInt('Photobooth', 'postprocess_workers'),
+            config.getInt('Photobooth', 'postprocess_timeout'))
+
+        # Pictures are written to tmpfs first and to disk in the background
+        self._store = TieredStore(config)
+
+        # Index of all sessions and files
+        self._gallery = Gallery(config.get('Storage', 'gallery'))
+
+        # Network uploads go through a durable spool that retries them
+        # until they succeed, also across restarts
+        self._outbox = Outbox(config, self._store.locate,
+                              self._gallery.setStatus)
 
         self.initPostprocessTasks(config)
         self.initPictureTasks(config)
+        self.initUploadTasks(config)
+
+        self._outbox.start()
 
     def initPostprocessTasks(self, config):
 
-        self._postprocess_tasks = []
+        # PictureSaver for assembled pictures, the other tasks run alongside
+        # or after it (see doPostprocessTasks)
+        self._picture_saver = PictureSaver(self._pic_tracker.basedir,
+                                           self._store)
 
-        # PictureSaver for assembled pictures
-        self._postprocess_tasks.append(PictureSaver(self._pic_tracker.basedir))
+        # Derivatives for scaled-down versions of assembled pictures
+        if config.getBool('Derivatives', 'enable'):
+            self._derivatives = Derivatives(config, self._store)
+        else:
+            self._derivatives = None
 
-        # QRCode to print a qrcode link
+        # QRCode to print a qrcode link, rendered while the guest is posing
+        # and printed once the picture is saved
         if config.getBool('QRCode', 'enable'):
-            self._postprocess_tasks.append(QRCode(config))
+            self._qrcode = QRCode(config)
+        else:
+            self._qrcode = None
+        self._qrcode_prepared = None
 
-        # PictureMailer for assembled pictures
+    def initUploadTasks(self, config):
+
+        # Outbox destinations as tuples of (name, task, send shots, minimum
+        # picture size)
+        self._uploads = []
+
+        # PictureMailer for assembled pictures, sent in digests
         if config.getBool('Mailer', 'enable'):
-            self._postprocess_tasks.append(PictureMailer(config))
+            task = PictureMailer(config)
+            self._outbox.register('mail', task.do, task.digest)
+            self._uploads.append(('mail', task, False,
+                                  config.getInt('Mailer', 'picture_size')))
 
         # PictureUploadWebdav to upload pictures to a webdav storage
         if config.getBool('UploadWebdav', 'enable'):
-            self._postprocess_tasks.append(PictureUploadWebdav(config))
+            task = PictureUploadWebdav(config)
+            self._outbox.register('webdav', task.do)
+            self._uploads.append(('webdav', task,
+                                  config.getBool('UploadWebdav',
+                                                 'upload_shots'),
+                                  config.getInt('UploadWebdav',
+                                                'picture_size')))
 
-        # PictureSSH to upload pictures to an SSH server
+        # PictureSSH to upload pictures to an SSH server, including shots
         if config.getBool('SSH', 'enable'):
-            self._postprocess_tasks.append(PictureSSH(config))
+            task = PictureSSH(config)
+            self._outbox.register('ssh', task.do)
+            self._uploads.append(('ssh', task, True,
+                                  config.getInt('SSH', 'picture_size')))
 
     def initPictureTasks(self, config):
 
         self._picture_tasks = []
 
         # PictureSaver for single shots
-        self._picture_tasks.append(PictureSaver(self._pic_tracker.basedir))
+        self._picture_tasks.append(PictureSaver(self._pic_tracker.basedir,
+                                                self._store))
 
     def run(self):
 
-        for state in self._comm.iter(Workers.WORKER):
-            self.handleState(state)
+        try:
+            for state in self._comm.iter(Workers.WORKER):
+                self.handleState(state)
+        finally:
+            # Drain pending tasks first, they may still queue uploads
+            self._executor.shutdown(wait=True)
+            self._outbox.shutdown()
+            for _, task, _, _ in self._uploads:
+                task.close()
+            if self._qrcode is not None:
+                self._qrcode.close()
+            self._store.close()
+            self._gallery.close()
 
         return True
 
@@ -68,12 +143,19 @@ class Worker:
             self.teardown(state)
         elif isinstance(state, StateMachine.GreeterState):
             self._pic_tracker.initializeNextPicture()
+            self._gallery.addSession(self._pic_tracker.picture_time)
+            if self._qrcode is not None:
+                self._qrcode_prepared = self._executor.submit(
+                    'QRCode', self._qrcode.prepare,
+                    self._pic_tracker.picture_time)
         elif isinstance(state, StateMachine.ReviewState):
+            picture_time = self._pic_tracker.picture_time
+            self._gallery.setSessionTime(picture_time, 'reviewed')
             self.doPostprocessTasks(state.picture)
-            # Wait until all files are saved
-            while not self._pic_tracker.checkAllFilesExists():
-                time.sleep(0.5)
-            self._comm.send(Workers.MASTER, StateMachine.WorkerEvent('idle'))
+            # Continue as soon as all files are stored locally. Shots may
+            # still be pending as they are sent on the bulk lane.
+            self._pic_tracker.saved.add_done_callback(
+                lambda future: self.pictureSaved(picture_time))
         elif isinstance(state, StateMachine.CameraEvent):
             if state.name == 'capture':
                 filepath = self._pic_tracker.getNextShot()
@@ -85,18 +167,96 @@ class Worker:
 
         pass
 
-    def doPostprocessTasks(self, picture):
+    def pictureSaved(self, picture_time):
+
+        self._comm.send(Workers.MASTER, StateMachine.WorkerEvent('idle'))
+        self._gallery.setSessionTime(picture_time, 'saved')
+
+    def savePicture(self, task, picture, filepath, picture_time, kind):
+
+        task.do(picture, filepath)
+        try:
+            self._gallery.addFile(picture_time, kind, filepath,
+                                  picture.getbuffer())
+        except Exception as e:
+            logging.error('Could not add %s to gallery: %s', filepath, e)
+
+    def saveVersion(self, picture, filepath, picture_time, name, size):
 
-        for task in self._postprocess_tasks:
-            if isinstance(task, PictureSSH):
-                # For SSH send individual shots and assembled picture
-                task.do([self._pic_tracker.getPicturePath()] + self._pic_tracker.shots)
-            elif isinstance(task, QRCode):
-                task.do(picture, self._pic_tracker)
+        path, version = self._derivatives.do(picture, filepath, name, size)
+        if path is not None:
+            self._gallery.addFile(picture_time, name, path,
+                                  version.getbuffer())
+
+    def selectVersion(self, filepath, picture_time, size):
+
+        # Smallest version that is at least of the requested size
+        if size > 0:
+            try:
+                path = self._gallery.selectVersion(picture_time, size)
+            except Exception as e:
+                logging.error('Could not look up versions of %s: %s',
+                              filepath, e)
             else:
-                task.do(picture, self._pic_tracker.getPicturePath())
+                if path is not None:
+                    return path
+        return filepath
+
+    def printQRCode(self, filepath, picture_time):
+
+        def printed(future):
+            status = 'printed' if future.exception() is None else 'failed'
+            self._gallery.setStatus(filepath, 'qrcode', status)
+
+        self._qrcode.do(picture_time).add_done_callback(printed)
+
+    def doPostprocessTasks(self, picture):
+
+        # Tasks finish after the tracker moved on to the next picture, hence
+        # they get the current values instead of the tracker itself
+        filepath = self._pic_tracker.getPicturePath()
+        shots = self._pic_tracker.expected_shots
+        picture_time = self._pic_tracker.picture_time
+
+        self._pic_tracker.addFile(self._executor.submit(
+            'PictureSaver', self.savePicture, self._picture_saver, picture,
+            filepath, picture_time, 'picture'))
+
+        if self._qrcode is not None:
+            prepared = self._qrcode_prepared
+            self._executor.submit('QRCode', self.printQRCode, filepath,
+                                  picture_time,
+                                  depends=(self._pic_tracker.saved,),
+                                  after=() if prepared is None else (prepared,))
+
+        # Scaled-down versions are created in parallel, in the background
+        versions = []
+        if self._derivatives is not None:
+            for name, size in self._derivatives.versions:
+                versions.append(self._executor.submit(
+                    'Derivatives', self.saveVersion, picture, filepath,
+                    picture_time, name, size))
+
+        # Uploads are sent from the saved files, using the original picture
+        # if a version could not be created
+        self._executor.submit('Outbox', self.queueUploads, filepath,
+                              picture_time, shots,
+                              depends=(self._pic_tracker.saved,),
+                              after=versions)
+
+    def queueUploads(self, filepath, picture_time, shots):
+
+        for destination, _, with_shots, size in self._uploads:
+            self._outbox.put(destination,
+                             self.selectVersion(filepath, picture_time, size))
+            if with_shots:
+                for shot in shots:
+                    self._outbox.put(destination, shot)
 
     def doPictureTasks(self, picture, filepath):
 
+        picture_time = self._pic_tracker.picture_time
         for task in self._picture_tasks:
-            task.do(picture, filepath)
+            self._pic_tracker.addFile(self._executor.submit(
+                type(task).__name__, self.savePicture, task, picture,
+                filepath, picture_time, 'shot'))
@@ -175,7 +175,6 @@ setup(
         'pycups',
         'requests',
         'paramiko',
-        'scp',
         'hidapi',
         'qrcode',
         'python-barcode'
@@ -196,7 +195,7 @@ setup(
         'dev': ['setuptools', 'wheel', 'twine', 'Babel',],
     },
 
-    python_requires='>=3.5',
+    python_requires='>=3.8',
 
     # If there are data files included in your packages that need to be
     # installed, specify them here.